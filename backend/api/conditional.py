@@ -0,0 +1,47 @@
+import functools
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+def conditional_get(method):
+    """Answer If-None-Match / If-Modified-Since before the handler runs.
+
+    The view provides `get_conditional_state(request)`, which returns the
+    parts of the resource version (or None when unknown) and an optional
+    last modification datetime. Both must be cheap to compute, and the
+    parts must include everything the representation depends on, per-user
+    state included.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        etag_parts, last_modified = self.get_conditional_state(request)
+
+        etag = None
+        if etag_parts is not None:
+            digest = hashlib.md5(
+                repr((etag_parts, request.accepted_renderer.format,
+                      request.get_full_path())).encode(),
+                usedforsecurity=False)
+            etag = quote_etag(digest.hexdigest())
+
+        last_modified = (int(last_modified.timestamp())
+                         if last_modified is not None else None)
+
+        response = get_conditional_response(request,
+                                            etag=etag,
+                                            last_modified=last_modified)
+        if response is None:
+            response = method(self, request, *args, **kwargs)
+
+        if response.status_code in (200, 304):
+            if etag is not None:
+                response.headers["ETag"] = etag
+            if last_modified is not None:
+                response.headers["Last-Modified"] = http_date(last_modified)
+        patch_vary_headers(response, ("Authorization", ))
+        return response
+
+    return wrapper
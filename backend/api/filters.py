@@ -1,5 +1,8 @@
-from django.db.models import Q
+from django import forms
+from django.conf import settings
+from django.db.models import Case, Q, When
 from django_filters import FilterSet, filters
+from recipes.inverted_index import recipe_ingredient_index
 from recipes.models import Ingredient, Recipe
 
 BOOL_CHOICES = (
@@ -11,6 +14,11 @@ BOOL_CHOICES = (
     ("false", "False"),
 )
 
+MATCH_CHOICES = (
+    ("all", "All"),
+    ("any", "Any"),
+)
+
 BOOL_MAPPINGS = {
     True: [string for string, _ in BOOL_CHOICES[:3]],
     False: [string for string, _ in BOOL_CHOICES[3:]],
@@ -26,6 +34,14 @@ def bool_coerce(value):
     raise ValueError()
 
 
+class IntegerFilter(filters.NumberFilter):
+    field_class = forms.IntegerField
+
+
+class IntegerInFilter(filters.BaseInFilter, IntegerFilter):
+    pass
+
+
 class RecipeFilter(FilterSet):
     is_favorited = filters.TypedChoiceFilter(
         choices=BOOL_CHOICES,
@@ -36,10 +52,17 @@ class RecipeFilter(FilterSet):
         choices=BOOL_CHOICES,
         coerce=bool_coerce,
         method="filter_is_in_shopping_cart")
+    search = filters.CharFilter(method="filter_search")
+    ingredients = IntegerInFilter(method="filter_ingredients")
+    match = filters.ChoiceFilter(choices=MATCH_CHOICES,
+                                 method="filter_ingredient_options")
+    max_missing = IntegerFilter(min_value=0,
+                                method="filter_ingredient_options")
 
     class Meta:
         model = Recipe
-        fields = ("is_favorited", "is_in_shopping_cart", "author")
+        fields = ("is_favorited", "is_in_shopping_cart", "author", "search",
+                  "ingredients", "match", "max_missing")
 
     def filter_is_favorited(self, queryset, name, value):
         if not self.request.user.is_authenticated:
@@ -61,6 +84,31 @@ class RecipeFilter(FilterSet):
 
         return queryset.filter(filter)
 
+    def filter_search(self, queryset, name, value):
+        if not value.strip():
+            return queryset
+
+        return queryset.search(value)
+
+    def filter_ingredients(self, queryset, name, value):
+        recipe_ids = recipe_ingredient_index.match(
+            value,
+            mode=self.form.cleaned_data.get("match") or "any",
+            max_missing=self.form.cleaned_data.get("max_missing"),
+            limit=settings.INGREDIENT_MATCH_LIMIT,
+        )
+        if not recipe_ids:
+            return queryset.none()
+
+        return queryset.filter(pk__in=recipe_ids).order_by(Case(*(
+            When(pk=recipe_id, then=position)
+            for position, recipe_id in enumerate(recipe_ids)
+        )))
+
+    def filter_ingredient_options(self, queryset, name, value):
+        # Read by filter_ingredients.
+        return queryset
+
 
 class IngredientFilter(FilterSet):
     name = filters.CharFilter(field_name="name", lookup_expr="istartswith")
@@ -1,5 +1,147 @@
+import base64
+import hashlib
+import json
+from functools import cached_property
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from foodgram_backend.constants import RECIPE_LIST_VERSION
+from foodgram_backend.versions import get_version
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPaginationMixin:
+    """Opt-in keyset pagination, enabled by passing `?cursor=`.
+
+    An empty cursor starts from the first page. Pages are selected with a
+    lexicographic comparison on `keyset_ordering` instead of OFFSET, and no
+    COUNT(*) is run. Without the cursor parameter the base pagination class
+    is used unchanged, unless `keyset_only` is set.
+
+    Querysets ordered explicitly, such as by search rank, cannot be paged
+    by the keyset, so they fall back to the base pagination class too.
+    """
+
+    cursor_query_param = "cursor"
+    keyset_page_size_query_param = "limit"
+    keyset_ordering = ()
+    invalid_cursor_message = "Invalid cursor"
+    keyset_only = False
+
+    keyset_mode = False
+
+    def _keyset_fields(self, model):
+        return [
+            (model._meta.get_field(name.lstrip("-")), name.startswith("-"))
+            for name in self.keyset_ordering
+        ]
+
+    def _get_keyset_page_size(self, request):
+        try:
+            return pagination._positive_int(
+                request.query_params[self.keyset_page_size_query_param],
+                strict=True)
+        except (KeyError, ValueError):
+            return api_settings.PAGE_SIZE
+
+    def _decode_cursor(self, request, fields):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(token.encode()))
+            position = [field.to_python(value) for (field, _), value
+                        in zip(fields, cursor["p"], strict=True)]
+            return position, bool(cursor["r"])
+        except (KeyError, TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _encode_cursor(self, obj, reverse):
+        cursor = {
+            "p": [field.value_to_string(obj) for field, _ in self._fields],
+            "r": int(reverse),
+        }
+        token = base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+        return replace_query_param(self.request.build_absolute_uri(),
+                                   self.cursor_query_param, token)
+
+    def _after_position(self, fields, position, reverse):
+        condition = None
+        for (field, descending), value in reversed(list(zip(fields,
+                                                            position))):
+            lookup = "lt" if descending != reverse else "gt"
+            following = Q(**{f"{field.attname}__{lookup}": value})
+            if condition is not None:
+                following |= Q(**{field.attname: value}) & condition
+            condition = following
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset_mode = self.keyset_only or (
+            self.cursor_query_param in request.query_params
+            and not queryset.query.order_by)
+        if not self.keyset_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self._fields = self._keyset_fields(queryset.model)
+        page_size = self._get_keyset_page_size(request)
+        position, reverse = self._decode_cursor(request, self._fields)
+
+        ordering = [
+            f"{'-' if descending != reverse else ''}{field.attname}"
+            for field, descending in self._fields
+        ]
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(
+                self._after_position(self._fields, position, reverse))
+
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+
+        has_next = has_more if not reverse else True
+        has_previous = has_more if reverse else position is not None
+        self.next_link = (self._encode_cursor(results[-1], False)
+                          if results and has_next else None)
+        self.previous_link = (self._encode_cursor(results[0], True)
+                              if results and has_previous else None)
+        return results
+
+    def get_paginated_response(self, data):
+        if not self.keyset_mode:
+            return super().get_paginated_response(data)
+
+        return Response({
+            "next": self.next_link,
+            "previous": self.previous_link,
+            "results": data,
+        })
+
+
+class CountedPaginator(Paginator):
+
+    def __init__(self, object_list, per_page, count_strategy):
+        super().__init__(object_list, per_page)
+        self.count_strategy = count_strategy
+        self.count_is_estimated = False
+
+    @cached_property
+    def count(self):
+        count, self.count_is_estimated = self.count_strategy(self.object_list)
+        return count
 
 
 class PageLimitPagination(pagination.PageNumberPagination):
@@ -13,3 +155,90 @@ class PageLimitPagination(pagination.PageNumberPagination):
             "previous": self.get_previous_link(),
             "results": data,
         })
+
+
+class CachedCountPagination(PageLimitPagination):
+    """Page pagination that avoids running COUNT(*) on every request.
+
+    Exact counts are cached per filter combination until `count_version`
+    is bumped or `COUNT_CACHE_TIMEOUT` passes. Unfiltered lists of large
+    PostgreSQL tables use the planner's `reltuples` estimate instead, which
+    the response reports through `count_estimated`.
+    """
+
+    count_version = None
+    user_dependent_params = ()
+
+    def django_paginator_class(self, queryset, page_size):
+        return CountedPaginator(queryset, page_size, self.get_count)
+
+    def _filter_params(self):
+        return sorted(
+            (key, value)
+            for key, value in self.request.query_params.lists()
+            if key not in (self.page_query_param, self.page_size_query_param)
+        )
+
+    def _count_cache_key(self, filter_params):
+        user_id = None
+        if any(key in self.user_dependent_params for key, _ in filter_params):
+            user_id = self.request.user.pk
+
+        digest = hashlib.md5(
+            repr((filter_params, user_id)).encode(), usedforsecurity=False)
+        return (f"count:{self.count_version}:"
+                f"{get_version(self.count_version)}:{digest.hexdigest()}")
+
+    def _estimate_count(self, queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != "postgresql":
+            return None
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class "
+                "WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+
+        if row is None or row[0] < settings.COUNT_ESTIMATE_THRESHOLD:
+            return None
+        return row[0]
+
+    def get_count(self, queryset):
+        filter_params = self._filter_params()
+        if not filter_params:
+            estimate = self._estimate_count(queryset)
+            if estimate is not None:
+                return estimate, True
+
+        cache_key = self._count_cache_key(filter_params)
+        count = cache.get(cache_key)
+        if count is None:
+            count = queryset.count()
+            cache.set(cache_key, count, settings.COUNT_CACHE_TIMEOUT)
+        return count, False
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data["count_estimated"] = (
+            self.page.paginator.count_is_estimated)
+        return response
+
+
+class RecipePagination(KeysetPaginationMixin, CachedCountPagination):
+    keyset_ordering = ("-published_at", "-id")
+    count_version = RECIPE_LIST_VERSION
+    user_dependent_params = ("is_favorited", "is_in_shopping_cart")
+
+
+class UserPagination(KeysetPaginationMixin,
+                     pagination.LimitOffsetPagination):
+    keyset_ordering = ("username", "id")
+
+
+class FeedPagination(KeysetPaginationMixin, pagination.BasePagination):
+    """Pages over timeline entries, not recipes."""
+
+    keyset_ordering = ("-published_at", "-recipe_id")
+    keyset_only = True
@@ -0,0 +1,118 @@
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.http import multipartparser
+from rest_framework import parsers
+from rest_framework.exceptions import ParseError
+
+IMAGE_SIGNATURES = {
+    "png": (b"\x89PNG\r\n\x1a\n", ),
+    "jpeg": (b"\xff\xd8\xff", ),
+    "gif": (b"GIF87a", b"GIF89a"),
+}
+IMAGE_HEADER_LENGTH = 12
+RAW_UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class ImageUploadError(multipartparser.MultiPartParserError):
+    pass
+
+
+def detect_image_format(header):
+    """Return the image format given the leading bytes, or None."""
+    for image_format, signatures in IMAGE_SIGNATURES.items():
+        if header.startswith(signatures):
+            return image_format
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def check_image_header(header):
+    image_format = detect_image_format(header[:IMAGE_HEADER_LENGTH])
+    if image_format is None:
+        raise ImageUploadError("Unsupported image format.")
+    return image_format
+
+
+def check_image_size(size):
+    if size > settings.IMAGE_UPLOAD_MAX_SIZE:
+        raise ImageUploadError(
+            f"Image is larger than {settings.IMAGE_UPLOAD_MAX_SIZE} bytes.")
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """Streams uploaded files to disk, rejecting bad images early.
+
+    The declared request size is checked before the body is read, and the
+    format is checked on the first chunk of every file.
+    """
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        check_image_size(content_length)
+
+    def receive_data_chunk(self, raw_data, start):
+        if start == 0:
+            check_image_header(raw_data)
+        check_image_size(start + len(raw_data))
+        return super().receive_data_chunk(raw_data, start)
+
+
+class ImageMultiPartParser(parsers.MultiPartParser):
+    """Multipart parser that streams files through ImageUploadHandler.
+
+    Nested fields, such as recipe ingredients, are sent as JSON strings.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        request = parser_context["request"]
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        meta = request.META.copy()
+        meta["CONTENT_TYPE"] = media_type
+
+        try:
+            parser = multipartparser.MultiPartParser(
+                meta, stream, [ImageUploadHandler(request)], encoding)
+            data, files = parser.parse()
+            return parsers.DataAndFiles(data, files)
+        except multipartparser.MultiPartParserError as exc:
+            raise ParseError(f"Multipart form parse error - {exc}")
+
+
+class RawImageParser(parsers.BaseParser):
+    """Parses a raw image body into the view's `raw_upload_field`.
+
+    The declared size and the leading bytes are checked before the rest of
+    the body is streamed to a temporary file.
+    """
+
+    media_type = "image/*"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        request = parser_context["request"]
+        field_name = parser_context["view"].raw_upload_field
+
+        try:
+            check_image_size(int(request.META.get("CONTENT_LENGTH") or 0))
+            header = stream.read(IMAGE_HEADER_LENGTH) if stream else b""
+            image_format = check_image_header(header)
+
+            upload = TemporaryUploadedFile(f"image.{image_format}",
+                                           f"image/{image_format}", 0, None)
+            upload.write(header)
+            size = len(header)
+            while chunk := stream.read(RAW_UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > settings.IMAGE_UPLOAD_MAX_SIZE:
+                    upload.close()
+                    check_image_size(size)
+                upload.write(chunk)
+        except ImageUploadError as exc:
+            raise ParseError(str(exc))
+
+        upload.seek(0)
+        upload.size = size
+        return parsers.DataAndFiles({}, {field_name: upload})
@@ -1,28 +1,106 @@
 import base64
+import binascii
+import hashlib
+import json
+from functools import partial
 
+from django.conf import settings
+from django.core.cache import cache
 from django.core.files.base import ContentFile
-from django.db import transaction
+from django.db import models, transaction
+from django.http import QueryDict
 from django.urls import reverse
 from djoser import serializers as djoser_serializers
-from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart)
+from foodgram_backend import cache_stats
+from foodgram_backend.constants import (
+    INGREDIENT_CATALOG_VERSION,
+    RECIPE_FRAGMENT_CACHE,
+)
+from foodgram_backend.image_variants import variant_sources, variant_url
+from foodgram_backend.versions import get_version
+from recipes.catalog import ingredient_index
+from recipes.inverted_index import recipe_ingredients_changed
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    ShoppingCartItem,
+    update_counter,
+)
+from recipes.timeline import fan_out_recipe
 from rest_framework import serializers
 from users.models import Subscription, User
 
+from .parsers import IMAGE_HEADER_LENGTH, detect_image_format
+
+
+def build_url(context, url):
+    """Absolute URL with a request in the context, as DRF's ImageField."""
+    request = context.get("request")
+    if request is None:
+        return url
+    return request.build_absolute_uri(url)
+
+
+def build_srcsets(context, field_file):
+    """Return `{format: srcset}` of the image's ready variants."""
+    return {
+        image_format: ", ".join(f"{build_url(context, url)} {width}w"
+                                for url, width in sources)
+        for image_format, sources in variant_sources(field_file).items()
+        if sources
+    }
+
 
 class Base64ImageField(serializers.ImageField):
+    """Image field that also accepts `data:image/...;base64,` strings.
+
+    The decoded size and the image signature are checked before the whole
+    string is decoded.
+    """
+
+    def _decode(self, image_string):
+        if len(image_string) * 3 // 4 > settings.IMAGE_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                f"Image is larger than {settings.IMAGE_UPLOAD_MAX_SIZE} "
+                "bytes.")
+
+        try:
+            header = base64.b64decode(
+                image_string[:(IMAGE_HEADER_LENGTH + 2) // 3 * 4])
+            if detect_image_format(header) is None:
+                self.fail("invalid_image")
+            return base64.b64decode(image_string)
+        except binascii.Error:
+            self.fail("invalid")
 
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith("data:image"):
-            format, image_string = data.split(";base64,")
+            format, _, image_string = data.partition(";base64,")
             extension = format.split("/")[-1]
 
-            data = ContentFile(base64.b64decode(image_string),
+            data = ContentFile(self._decode(image_string),
                                name="temp." + extension)
 
         return super().to_internal_value(data)
 
 
+class VariantImageField(serializers.ImageField):
+    """Read-only image field rendering the URL of a resized variant."""
+
+    def __init__(self, variant, **kwargs):
+        self.variant = variant
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        return build_url(self.context, variant_url(value, self.variant))
+
+
 class AvatarSerializer(serializers.ModelSerializer):
     avatar = Base64ImageField()
 
@@ -33,11 +111,23 @@ class AvatarSerializer(serializers.ModelSerializer):
 
     def to_representation(self, user):
         if user.avatar:
-            request = self.context.get("request")
-            return {"avatar": request.build_absolute_uri(user.avatar.url)}
+            return {"avatar": build_url(
+                self.context, variant_url(user.avatar, "avatar"))}
         return {"avatar": None}
 
 
+class RecipeImageSerializer(serializers.ModelSerializer):
+    image = Base64ImageField()
+
+    class Meta:
+        model = Recipe
+        fields = ("image", )
+
+    def to_representation(self, recipe):
+        return {"image": build_url(
+            self.context, variant_url(recipe.image, "detail"))}
+
+
 class UserShortSerializer(djoser_serializers.UserCreateSerializer):
 
     class Meta(djoser_serializers.UserCreateSerializer.Meta):
@@ -68,8 +158,56 @@ class UserShortSerializer(djoser_serializers.UserCreateSerializer):
         }
 
 
+class SubscriptionResolver:
+    """Resolves is_subscribed for every user rendered by one serializer tree.
+
+    The first lookup collects the users reachable from the root instance
+    (users themselves or recipe authors) and loads which of them the
+    requesting user is subscribed to in a single query.
+    """
+
+    def __init__(self, subscriber, root_instance):
+        self.subscriber = subscriber
+        self.root_instance = root_instance
+        self._resolved_ids = None
+        self._subscribed_to_ids = None
+
+    def _rendered_user_ids(self):
+        objects = self.root_instance
+        if not isinstance(objects, (list, tuple, models.QuerySet)):
+            objects = [objects]
+
+        user_ids = set()
+        for obj in objects:
+            if isinstance(obj, User):
+                user_ids.add(obj.pk)
+            elif isinstance(obj, Recipe):
+                user_ids.add(obj.author_id)
+        return user_ids
+
+    def _load(self):
+        self._resolved_ids = self._rendered_user_ids()
+        self._subscribed_to_ids = set(
+            Subscription.objects
+            .filter(subscriber=self.subscriber,
+                    subscribed_to__in=self._resolved_ids)
+            .values_list("subscribed_to_id", flat=True)
+        ) if self._resolved_ids else set()
+
+    def is_subscribed(self, other_user):
+        if self._resolved_ids is None:
+            self._load()
+
+        if other_user.pk not in self._resolved_ids:
+            return Subscription.objects.filter(
+                subscriber=self.subscriber,
+                subscribed_to=other_user).exists()
+
+        return other_user.pk in self._subscribed_to_ids
+
+
 class UserSerializer(UserShortSerializer):
-    avatar = serializers.ImageField(read_only=True)
+    avatar = VariantImageField("avatar")
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta(UserShortSerializer.Meta):
@@ -80,8 +218,12 @@ class UserSerializer(UserShortSerializer):
         if request is None or request.user.is_anonymous:
             return False
 
-        return Subscription.objects.filter(subscriber=request.user,
-                                           subscribed_to=other_user).exists()
+        if "subscription_resolver" not in self.context:
+            self.context["subscription_resolver"] = SubscriptionResolver(
+                request.user, self.root.instance)
+
+        return self.context["subscription_resolver"].is_subscribed(
+            other_user)
 
 
 class UserWithRecipesSerializer(UserSerializer):
@@ -92,12 +234,12 @@ class UserWithRecipesSerializer(UserSerializer):
         fields = UserSerializer.Meta.fields + ("recipes", "recipes_count")
 
     def get_recipes(self, other_user):
-        recipes = other_user.recipes.all()
-        recipes_limit = self.context.get("request").query_params.get(
-            "recipes_limit", None)
-        if recipes_limit is not None:
-            recipes_limit = int(recipes_limit)
-            recipes = recipes[:recipes_limit]
+        recipes = getattr(other_user, "recent_recipes", None)
+        if recipes is None:
+            recipes = other_user.recipes.all()
+            recipes_limit = self.context.get("recipes_limit")
+            if recipes_limit is not None:
+                recipes = recipes[:recipes_limit]
 
         serializer = RecipeShortSerializer(instance=recipes,
                                            many=True,
@@ -140,18 +282,40 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 
 class RecipeIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.ReadOnlyField(source="ingredient.id")
-    name = serializers.ReadOnlyField(source="ingredient.name")
-    measurement_unit = serializers.ReadOnlyField(
-        source="ingredient.measurement_unit")
+    """Renders names and units from the in-process ingredient catalog.
+
+    Rows are resolved from the `ingredient_catalog` snapshot that
+    RecipeSerializer puts in the context, or looked up one by one without
+    it.
+    """
+
+    id = serializers.IntegerField(source="ingredient_id")
+    name = serializers.SerializerMethodField()
+    measurement_unit = serializers.SerializerMethodField()
 
     class Meta:
         model = RecipeIngredient
         fields = ("id", "name", "measurement_unit", "amount")
 
+    def to_representation(self, recipe_ingredient):
+        ingredient_id = recipe_ingredient.ingredient_id
+        catalog = self.context.get("ingredient_catalog") or {}
+        # Only an ingredient deleted during the request is missing here.
+        self._catalog_entry = (catalog.get(ingredient_id)
+                               or ingredient_index.get(ingredient_id)
+                               or (None, None))
+        return super().to_representation(recipe_ingredient)
+
+    def get_name(self, recipe_ingredient):
+        return self._catalog_entry[0]
+
+    def get_measurement_unit(self, recipe_ingredient):
+        return self._catalog_entry[1]
+
 
 class RecipeShortSerializer(serializers.ModelSerializer):
     image = Base64ImageField(write_only=True, required=True)
+    image_variant = "card"
 
     class Meta:
         model = Recipe
@@ -159,8 +323,10 @@ class RecipeShortSerializer(serializers.ModelSerializer):
 
     def to_representation(self, recipe):
         recipe_representation = super().to_representation(recipe)
-        recipe_representation["image"] = self.context.get(
-            "request").build_absolute_uri(recipe.image.url)
+        recipe_representation["image"] = build_url(
+            self.context, variant_url(recipe.image, self.image_variant))
+        recipe_representation["image_srcset"] = build_srcsets(
+            self.context, recipe.image)
         return recipe_representation
 
 
@@ -179,7 +345,16 @@ class ShortLinkSerializer(serializers.ModelSerializer):
         }
 
 
+class RecipeListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        if isinstance(data, models.manager.BaseManager):
+            data = data.all()
+        return self.child.to_representation_many(list(data))
+
+
 class RecipeSerializer(RecipeShortSerializer):
+    image_variant = "detail"
     author = UserSerializer(read_only=True)
 
     is_favorited = serializers.SerializerMethodField()
@@ -194,6 +369,95 @@ class RecipeSerializer(RecipeShortSerializer):
         fields = ("id", "author", "ingredients", "is_favorited",
                   "is_in_shopping_cart", "name", "image", "text",
                   "cooking_time")
+        list_serializer_class = RecipeListSerializer
+
+    def __init__(self, instance=None, data=serializers.empty, **kwargs):
+        if isinstance(data, QueryDict):
+            data = self._parse_form_data(data)
+        super().__init__(instance, data, **kwargs)
+
+    @staticmethod
+    def _parse_form_data(data):
+        """Flatten multipart data, where ingredients are a JSON string."""
+        data = data.dict()
+        if isinstance(data.get("ingredients"), str):
+            try:
+                data["ingredients"] = json.loads(data["ingredients"])
+            except ValueError:
+                pass
+        return data
+
+    def _fragment_key(self, recipe, catalog_version):
+        author = recipe.author
+        digest = hashlib.md5(repr((
+            recipe.pk,
+            recipe.updated_at.isoformat(),
+            author.pk,
+            author.email,
+            author.username,
+            author.first_name,
+            author.last_name,
+            author.avatar.name,
+            author.avatar_variants,
+            catalog_version,
+            build_url(self.context, "/"),
+        )).encode(), usedforsecurity=False)
+        return f"recipe_fragment:{recipe.pk}:{digest.hexdigest()}"
+
+    def _render_fragment(self, recipe):
+        fragment = super().to_representation(recipe)
+        fragment["is_favorited"] = None
+        fragment["is_in_shopping_cart"] = None
+        fragment["author"]["is_subscribed"] = None
+        return fragment
+
+    def _overlay_user_state(self, recipe, fragment):
+        representation = {**fragment, "author": {**fragment["author"]}}
+        representation["is_favorited"] = self.get_is_favorited(recipe)
+        representation["is_in_shopping_cart"] = (
+            self.get_is_in_shopping_cart(recipe))
+        representation["author"]["is_subscribed"] = (
+            self.fields["author"].get_is_subscribed(recipe.author))
+        return representation
+
+    def to_representation_many(self, recipes):
+        """Render recipes from cached viewer-independent fragments.
+
+        Fragments are keyed by the recipe's updated_at, its author's
+        profile and the ingredient catalog version, so any of those writes
+        leads to a new key. Only the misses get their ingredients
+        prefetched and serialized, against one catalog lookup for all of
+        them; the per-user flags are laid over every fragment from the
+        batched annotations and subscription resolver.
+        """
+        catalog_version = get_version(INGREDIENT_CATALOG_VERSION)
+        keys = {recipe.pk: self._fragment_key(recipe, catalog_version)
+                for recipe in recipes}
+        fragments = cache.get_many(keys.values())
+
+        misses = [recipe for recipe in recipes
+                  if keys[recipe.pk] not in fragments]
+        if misses:
+            models.prefetch_related_objects(
+                misses, "recipe_ingredients")
+            self.context["ingredient_catalog"] = ingredient_index.lookup({
+                recipe_ingredient.ingredient_id
+                for recipe in misses
+                for recipe_ingredient in recipe.recipe_ingredients.all()
+            })
+            rendered = {keys[recipe.pk]: self._render_fragment(recipe)
+                        for recipe in misses}
+            cache.set_many(rendered, settings.RECIPE_FRAGMENT_CACHE_TIMEOUT)
+            fragments.update(rendered)
+
+        cache_stats.record(RECIPE_FRAGMENT_CACHE,
+                           hits=len(recipes) - len(misses),
+                           misses=len(misses))
+        return [self._overlay_user_state(recipe, fragments[keys[recipe.pk]])
+                for recipe in recipes]
+
+    def to_representation(self, recipe):
+        return self.to_representation_many([recipe])[0]
 
     def validate(self, recipe):
 
@@ -206,10 +470,18 @@ class RecipeSerializer(RecipeShortSerializer):
             raise serializers.ValidationError(
                 {"ingredients": ["Ingredients cannot be empty."]})
 
+        # Partial updates skip required nested fields, so check them here.
+        if any(not {"ingredient_id", "amount"} <= ingredient.keys()
+               for ingredient in ingredients):
+            raise serializers.ValidationError(
+                {"ingredients": ["Every ingredient needs an id and amount."]})
+
         return super().validate(recipe)
 
-    def _create_ingredients(self, recipe, ingredients):
-        ingredients_ids = [ingredient["id"] for ingredient in ingredients]
+    def _ingredient_amounts(self, ingredients):
+        ingredients_ids = [
+            ingredient["ingredient_id"] for ingredient in ingredients
+        ]
         ingredients_amounts = [
             ingredient["amount"] for ingredient in ingredients
         ]
@@ -218,61 +490,74 @@ class RecipeSerializer(RecipeShortSerializer):
             raise serializers.ValidationError(
                 {"ingredients": ["Ingredients cannot repeat."]})
 
-        existing_ingredients_ids = Ingredient.objects.filter(
-            id__in=ingredients_ids).values_list("id", flat=True)
-
-        if len(existing_ingredients_ids) != len(ingredients_ids):
-            missing_id = (id for id in ingredients_ids
-                          if id not in existing_ingredients_ids).__next__()
+        missing_ids = ingredient_index.missing(ingredients_ids)
+        if missing_ids:
             raise serializers.ValidationError(
-                {"detail": f"Ingredient with id {missing_id} does not exist."})
+                {"detail": f"Ingredient with id {missing_ids[0]} "
+                           "does not exist."})
 
-        RecipeIngredient.objects.bulk_create([
-            RecipeIngredient(
-                recipe=recipe,
-                ingredient_id=id,
-                amount=amount,
-            ) for id, amount in zip(ingredients_ids, ingredients_amounts)
-        ])
+        return dict(zip(ingredients_ids, ingredients_amounts))
 
     def create(self, validated_data):
 
-        validated_data.pop("recipe_ingredients", None)
+        amounts = self._ingredient_amounts(
+            validated_data.pop("recipe_ingredients"))
 
         with transaction.atomic():
             recipe = Recipe.objects.create(**validated_data)
-
-            self._create_ingredients(recipe,
-                                     self.initial_data.get("ingredients"))
+            update_counter(recipe.author, "recipes_count", 1)
+            fan_out_recipe(recipe)
+
+            RecipeIngredient.objects.bulk_create([
+                RecipeIngredient(recipe=recipe, ingredient_id=id,
+                                 amount=amount)
+                for id, amount in amounts.items()
+            ])
+            transaction.on_commit(
+                partial(recipe_ingredients_changed, [recipe.pk]))
+            Recipe.objects.filter(pk=recipe.pk).update_search_vector()
 
         return recipe
 
     def update(self, recipe, validated_data):
 
-        validated_data.pop("recipe_ingredients", None)
-
-        ingredients = self.initial_data.get("ingredients")
-        if ingredients is not None:
+        ingredients = validated_data.pop("recipe_ingredients", None)
 
-            RecipeIngredient.objects.filter(recipe=recipe).delete()
+        with transaction.atomic():
+            if ingredients is not None:
+                amounts = self._ingredient_amounts(ingredients)
+                old_amounts = recipe.set_ingredient_amounts(amounts)
 
-            self._create_ingredients(recipe, ingredients)
+                if old_amounts.keys() != amounts.keys():
+                    transaction.on_commit(
+                        partial(recipe_ingredients_changed, [recipe.pk]))
+                if old_amounts != amounts:
+                    ShoppingCartItem.objects.change_recipe(
+                        recipe, old_amounts, amounts)
 
-        recipe = super().update(recipe, validated_data)
+            recipe = super().update(recipe, validated_data)
+            Recipe.objects.filter(pk=recipe.pk).update_search_vector()
 
         return recipe
 
-    def _user_recipe_getter_mixin(self, recipe, model):
+    def _user_recipe_getter_mixin(self, recipe, model, annotation):
         user = self.context.get("request").user
         if not user.is_authenticated:
             return False
+
+        annotated_value = getattr(recipe, annotation, None)
+        if annotated_value is not None:
+            return annotated_value
+
         return model.objects.filter(user=user, recipe=recipe).exists()
 
     def get_is_favorited(self, recipe):
-        return self._user_recipe_getter_mixin(recipe, Favorite)
+        return self._user_recipe_getter_mixin(recipe, Favorite,
+                                              "is_favorited")
 
     def get_is_in_shopping_cart(self, recipe):
-        return self._user_recipe_getter_mixin(recipe, ShoppingCart)
+        return self._user_recipe_getter_mixin(recipe, ShoppingCart,
+                                              "is_in_shopping_cart")
 
 
 class SelfSubscriptionValidator(serializers.Serializer):
@@ -284,18 +569,13 @@ class SelfSubscriptionValidator(serializers.Serializer):
         return value
 
 
-class BaseRelationshipSerializer(serializers.ModelSerializer):
+class BatchIdsValidator(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BATCH_MAX_ITEMS,
+    )
 
-    class Meta:
-        fields = []
-
-    def __init__(self, *args, **kwargs):
-        model_class = kwargs.get("context").get("model_class")
-        if model_class:
-            self.Meta.model = model_class
-        super().__init__(*args, **kwargs)
 
-    def create(self, validated_data):
-        validated_data[self.context["user_field"]] = self.context["user"]
-        validated_data[self.context["target_field"]] = self.context["target"]
-        return super().create(validated_data)
+class RecipesLimitValidator(serializers.Serializer):
+    recipes_limit = serializers.IntegerField(min_value=0, required=False)
@@ -1,7 +1,12 @@
 from django.urls import include, path
 from rest_framework import routers
 
-from .views import IngredientViewSet, RecipeViewSet, UserViewSet
+from .views import (
+    CacheStatsView,
+    IngredientViewSet,
+    RecipeViewSet,
+    UserViewSet,
+)
 
 router = routers.DefaultRouter()
 router.register(r"users", UserViewSet)
@@ -9,6 +14,7 @@ router.register(r"recipes", RecipeViewSet, basename="recipes")
 router.register(r"ingredients", IngredientViewSet, basename="ingredients")
 
 urlpatterns = [
+    path("cache-stats/", CacheStatsView.as_view(), name="cache_stats"),
     path("", include(router.urls)),
     path("auth/", include("djoser.urls.authtoken")),
     path("auth/", include("djoser.urls")),
@@ -1,22 +1,99 @@
-from django.db.models import Count, Sum
-from django.http import HttpResponse
+import itertools
+import re
+from functools import cached_property, partial
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Prefetch, Q, Sum, Window
+from django.db.models.functions import Greatest, RowNumber
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser import views as djoser_views
-from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart)
-from rest_framework import mixins, pagination, permissions, status, viewsets
+from foodgram_backend import cache_stats
+from foodgram_backend.constants import (
+    INGREDIENT_CATALOG_VERSION,
+    RECIPE_FRAGMENT_CACHE,
+    RECIPE_LIST_VERSION,
+    SHOPPING_LIST_CHUNK_SIZE,
+    TOKEN_AUTH_CACHE,
+    USER_PROFILE_VERSION,
+)
+from foodgram_backend.relations import (
+    create_relation,
+    create_relations,
+    delete_relation,
+    delete_relations,
+)
+from foodgram_backend.versions import (
+    bump_version,
+    get_version,
+    version_time,
+)
+from recipes.catalog import ingredient_index
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    ShoppingCart,
+    ShoppingCartItem,
+    TimelineEntry,
+    update_counter,
+    update_counters,
+)
+from recipes.ndjson import export_recipes
+from recipes.timeline import (
+    backfill_timeline,
+    backfill_timelines,
+    pull_timeline,
+    remove_from_timeline,
+    remove_from_timelines,
+    schedule_feed_mode_update,
+)
+from rest_framework import mixins, permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from users.models import Subscription, User
 
+from .conditional import conditional_get
 from .filters import IngredientFilter, RecipeFilter
-from .pagination import PageLimitPagination
+from .pagination import FeedPagination, RecipePagination, UserPagination
+from .parsers import ImageMultiPartParser, RawImageParser
 from .permissions import IsAuthorOrReadOnly
-from .serializers import (AvatarSerializer, BaseRelationshipSerializer,
-                          IngredientSerializer, RecipeSerializer,
-                          RecipeShortSerializer, SelfSubscriptionValidator,
-                          ShortLinkSerializer, UserWithRecipesSerializer)
+from .serializers import (
+    AvatarSerializer,
+    BatchIdsValidator,
+    IngredientSerializer,
+    RecipeImageSerializer,
+    RecipeSerializer,
+    RecipeShortSerializer,
+    RecipesLimitValidator,
+    SelfSubscriptionValidator,
+    ShortLinkSerializer,
+    UserWithRecipesSerializer,
+)
+
+ACCEPTS_GZIP_RE = re.compile(r"\bgzip\b")
+
+
+def streaming_attachment(request, content, content_type, filename):
+    """Stream `content` as a download, gzipped if the client accepts it."""
+    response = StreamingHttpResponse(content_type=content_type)
+
+    patch_vary_headers(response, ("Accept-Encoding", ))
+    if ACCEPTS_GZIP_RE.search(request.headers.get("Accept-Encoding", "")):
+        content = compress_sequence(content)
+        response["Content-Encoding"] = "gzip"
+
+    response.streaming_content = content
+    response["Content-Disposition"] = f"attachment; filename=\"{filename}\""
+    return response
 
 
 def _handle_relationship_action(view,
@@ -27,52 +104,177 @@ def _handle_relationship_action(view,
                                 user_field_name,
                                 target_field_name,
                                 delete_not_found_message,
-                                post_exists_message):
-    filter_kwargs = {user_field_name: user_object,
-                     target_field_name: target_object}
-    relationship_object = relationship_model.objects.filter(**filter_kwargs)
+                                post_exists_message,
+                                counter_field=None,
+                                on_created=None,
+                                on_deleted=None):
+    values = {user_field_name: user_object,
+              target_field_name: target_object}
 
     if request.method == "DELETE":
-        if not relationship_object.exists():
+        with transaction.atomic():
+            if not delete_relation(relationship_model, **values):
+                return Response(
+                    data={"detail": delete_not_found_message},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if counter_field is not None:
+                update_counter(target_object, counter_field, -1)
+            if on_deleted is not None:
+                on_deleted(user_object, target_object)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
+    with transaction.atomic():
+        if create_relation(relationship_model, **values) is None:
             return Response(
-                data={"detail": delete_not_found_message},
+                data={"detail": post_exists_message},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        relationship_object.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        if counter_field is not None:
+            update_counter(target_object, counter_field, 1)
+        if on_created is not None:
+            on_created(user_object, target_object)
 
-    if relationship_object.exists():
-        return Response(
-            data={"detail": post_exists_message},
-            status=status.HTTP_400_BAD_REQUEST
-        )
+    serializer = view.get_serializer(target_object)
+    return Response(data=serializer.data, status=status.HTTP_201_CREATED)
 
-    serializer = BaseRelationshipSerializer(
-        data={},
-        context={
-            "model_class": relationship_model,
-            "user": user_object,
-            "target": target_object,
-            "user_field": user_field_name,
-            "target_field": target_field_name,
-            "request": request
-        }
+
+def _handle_batch_relationship_action(request,
+                                      relationship_model,
+                                      target_model,
+                                      target_ids,
+                                      user_field_name,
+                                      target_field_name,
+                                      counter_field=None,
+                                      on_created=None,
+                                      on_deleted=None,
+                                      rejected=None,
+                                      stamp_field=None,
+                                      version=None):
+    """Link or unlink the user and many targets, reporting every id.
+
+    Each chunk of BATCH_MAX_ITEMS ids is written with one INSERT or
+    DELETE. `rejected` maps ids refused upfront to their status.
+    Callbacks receive the user and the ids that actually changed.
+
+    No per-row signals are sent. Instead the changed targets get
+    `stamp_field` set in the same UPDATE as their counter, and `version`
+    is bumped once on commit.
+    """
+    rejected = rejected or {}
+    target_ids = list(dict.fromkeys(target_ids))
+    existing_ids = set(
+        target_model.objects
+        .filter(pk__in=[id for id in target_ids if id not in rejected])
+        .values_list("pk", flat=True)
     )
-    serializer.is_valid(raise_exception=True)
-    serializer.save()
+    rows = [{user_field_name: request.user, target_field_name: id}
+            for id in target_ids if id in existing_ids]
+    target_attname = relationship_model._meta.get_field(
+        target_field_name).attname
 
-    serializer = view.get_serializer(target_object)
-    return Response(data=serializer.data, status=status.HTTP_201_CREATED)
+    if request.method == "DELETE":
+        write, delta, callback = delete_relations, -1, on_deleted
+        statuses = ("deleted", "absent")
+    else:
+        write, delta, callback = create_relations, 1, on_created
+        statuses = ("created", "exists")
+
+    with transaction.atomic():
+        changed_ids = {
+            getattr(instance, target_attname)
+            for chunk in itertools.batched(rows, settings.BATCH_MAX_ITEMS)
+            for instance in write(relationship_model, list(chunk),
+                                  send_signals=False)
+        }
+        stamp = {} if stamp_field is None else {stamp_field: timezone.now()}
+        if changed_ids and counter_field is not None:
+            update_counters(target_model, changed_ids, counter_field, delta,
+                            **stamp)
+        elif changed_ids and stamp:
+            target_model.objects.filter(pk__in=changed_ids).update(**stamp)
+        if changed_ids and version is not None:
+            transaction.on_commit(partial(bump_version, version))
+        if changed_ids and callback is not None:
+            callback(request.user, changed_ids)
+
+    results = []
+    for id in target_ids:
+        if id in rejected:
+            outcome = rejected[id]
+        elif id not in existing_ids:
+            outcome = "not_found"
+        else:
+            outcome = statuses[0] if id in changed_ids else statuses[1]
+        results.append({"id": id, "status": outcome})
+    return Response({"results": results})
+
+
+def _recent_recipes_prefetch(recipes_limit):
+    recipes = Recipe.objects.all()
+    if recipes_limit is not None:
+        recipes = (
+            recipes
+            .annotate(row_number=Window(
+                RowNumber(),
+                partition_by=F("author_id"),
+                order_by=(F("published_at").desc(), F("id").desc()),
+            ))
+            .filter(row_number__lte=recipes_limit)
+        )
+
+    return Prefetch("recipes", queryset=recipes, to_attr="recent_recipes")
 
 
 class UserViewSet(djoser_views.UserViewSet):
-    queryset = (
-        User.objects
-        .annotate(recipes_count=Count("recipes"))
-    )
+    queryset = User.objects.all()
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    pagination_class = pagination.LimitOffsetPagination
+    pagination_class = UserPagination
+    raw_upload_field = None
+
+    @cached_property
+    def recipes_limit(self):
+        validator = RecipesLimitValidator(data=self.request.query_params)
+        validator.is_valid(raise_exception=True)
+        return validator.validated_data.get("recipes_limit")
+
+    @property
+    def renders_recipes(self):
+        return (self.action == "subscriptions"
+                or (self.action == "subscribe"
+                    and self.request.method == "POST"))
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+
+        if self.renders_recipes:
+            queryset = queryset.prefetch_related(
+                _recent_recipes_prefetch(self.recipes_limit))
+
+        return queryset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.renders_recipes:
+            context["recipes_limit"] = self.recipes_limit
+        return context
+
+    def perform_destroy(self, user):
+        with transaction.atomic():
+            Recipe.objects.filter(favorited_by__user=user).update(
+                favorites_count=Greatest(F("favorites_count") - 1, 0))
+            Recipe.objects.filter(in_shopping_cart_of__user=user).update(
+                in_carts_count=Greatest(F("in_carts_count") - 1, 0))
+            followed_ids = list(
+                User.objects.filter(subscribers__subscriber=user)
+                .values_list("pk", flat=True))
+            User.objects.filter(pk__in=followed_ids).update(
+                subscribers_count=Greatest(F("subscribers_count") - 1, 0))
+            for recipe in user.recipes.all():
+                ShoppingCartItem.objects.change_recipe(
+                    recipe, recipe.ingredient_amounts(), {})
+            user.delete()
+            schedule_feed_mode_update(followed_ids)
 
     @action(
         detail=False,
@@ -87,6 +289,8 @@ class UserViewSet(djoser_views.UserViewSet):
         methods=["put", "delete"],
         url_path="me/avatar",
         serializer_class=AvatarSerializer,
+        parser_classes=[JSONParser, ImageMultiPartParser, RawImageParser],
+        raw_upload_field="avatar",
     )
     def avatar(self, request):
         user = request.user
@@ -147,8 +351,45 @@ class UserViewSet(djoser_views.UserViewSet):
             "subscribed_to",
             "Not subscribed to that user.",
             "You are already subscribed to that user.",
+            counter_field="subscribers_count",
+            on_created=backfill_timeline,
+            on_deleted=remove_from_timeline,
         )
 
+    @action(
+        detail=False,
+        methods=["post", "delete"],
+        url_path="subscribe/batch",
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def subscribe_batch(self, request):
+        validator = BatchIdsValidator(data=request.data)
+        validator.is_valid(raise_exception=True)
+
+        return _handle_batch_relationship_action(
+            request,
+            Subscription,
+            User,
+            validator.validated_data["ids"],
+            "subscriber",
+            "subscribed_to",
+            counter_field="subscribers_count",
+            on_created=backfill_timelines,
+            on_deleted=remove_from_timelines,
+            rejected={request.user.pk: "self_subscription"},
+            version=USER_PROFILE_VERSION,
+        )
+
+
+class CacheStatsView(APIView):
+    permission_classes = (permissions.IsAdminUser, )
+
+    def get(self, request):
+        return Response({
+            name: cache_stats.get_stats(name)
+            for name in (RECIPE_FRAGMENT_CACHE, TOKEN_AUTH_CACHE)
+        })
+
 
 class IngredientViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin,
                         viewsets.GenericViewSet):
@@ -160,23 +401,185 @@ class IngredientViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin,
     filter_backends = [DjangoFilterBackend]
     filterset_class = IngredientFilter
 
+    def get_conditional_state(self, request):
+        return [get_version(INGREDIENT_CATALOG_VERSION)], None
+
+    @conditional_get
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @conditional_get
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get("name")
+        if name is None:
+            return super().list(request, *args, **kwargs)
+
+        return Response(ingredient_index.search(
+            name, limit=settings.INGREDIENT_SEARCH_LIMIT))
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
-    queryset = Recipe.objects.select_related("author").prefetch_related(
-        "recipe_ingredients",
-        "recipe_ingredients__ingredient"
-    )
+    queryset = Recipe.objects.select_related("author")
     serializer_class = RecipeSerializer
     permission_classes = [
         permissions.IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly
     ]
-    pagination_class = PageLimitPagination
+    pagination_class = RecipePagination
+    parser_classes = (JSONParser, ImageMultiPartParser)
+    raw_upload_field = None
 
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset
+
+        return queryset.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef("pk"))),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef("pk"))),
+        )
+
+    def _recipe_state(self, request):
+        try:
+            pk = Recipe._meta.pk.to_python(self.kwargs["pk"])
+        except ValidationError:
+            raise Http404
+        state = (
+            Recipe.objects
+            .filter(pk=pk)
+            .values_list("published_at", "updated_at", "author__updated_at")
+        )
+        if request.user.is_authenticated:
+            state = state.annotate(
+                is_favorited=Exists(Favorite.objects.filter(
+                    user=request.user, recipe=OuterRef("pk"))),
+                is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                    user=request.user, recipe=OuterRef("pk"))),
+                is_subscribed=Exists(Subscription.objects.filter(
+                    subscriber=request.user,
+                    subscribed_to=OuterRef("author"))),
+            )
+        return state.first()
+
+    def get_conditional_state(self, request):
+        catalog_version = get_version(INGREDIENT_CATALOG_VERSION)
+        versions = [catalog_version, request.user.pk]
+        if self.action == "list":
+            return [get_version(RECIPE_LIST_VERSION),
+                    get_version(USER_PROFILE_VERSION), *versions], None
+
+        state = self._recipe_state(request)
+        if state is None:
+            return None, None
+
+        last_modified = None
+        if not request.user.is_authenticated:
+            # Ingredient names and units are rendered from the catalog.
+            last_modified = max(state[1], state[2],
+                                version_time(catalog_version))
+        return [*state, *versions], last_modified
+
+    @conditional_get
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_get
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    def _reload_with_annotations(self, serializer):
+        serializer.instance = self.get_queryset().get(
+            pk=serializer.instance.pk)
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
+        self._reload_with_annotations(serializer)
+
+    def perform_update(self, serializer):
+        serializer.save()
+        self._reload_with_annotations(serializer)
+
+    def perform_destroy(self, recipe):
+        with transaction.atomic():
+            ShoppingCartItem.objects.change_recipe(
+                recipe, recipe.ingredient_amounts(), {})
+            update_counter(recipe.author, "recipes_count", -1)
+            recipe.delete()
+
+    @action(
+        detail=True,
+        methods=["put"],
+        serializer_class=RecipeImageSerializer,
+        parser_classes=[JSONParser, ImageMultiPartParser, RawImageParser],
+        raw_upload_field="image",
+    )
+    def image(self, request, pk):
+        serializer = self.get_serializer(self.get_object(), data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=["get"],
+        permission_classes=[permissions.IsAuthenticated],
+        pagination_class=FeedPagination,
+    )
+    def feed(self, request):
+        pull_timeline(request.user)
+        entries = self.paginate_queryset(
+            TimelineEntry.objects
+            .filter(user=request.user)
+            .only("recipe_id", "published_at"))
+        recipes = self.get_queryset().in_bulk(
+            [entry.recipe_id for entry in entries])
+        serializer = self.get_serializer(
+            [recipes[entry.recipe_id] for entry in entries
+             if entry.recipe_id in recipes],
+            many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        detail=True,
+        methods=["get"],
+        permission_classes=[permissions.AllowAny],
+    )
+    def similar(self, request, pk):
+        recipe = self.get_object()
+        recipes = (
+            self.get_queryset()
+            .filter(similar_to__recipe=recipe)
+            .order_by("-similar_to__score")
+        )
+        serializer = self.get_serializer(recipes, many=True)
+        return Response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=["get"],
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def recommended(self, request):
+        user = request.user
+        recipes = (
+            self.get_queryset()
+            .filter(
+                Q(similar_to__recipe__in=Favorite.objects.filter(
+                    user=user).values("recipe"))
+                | Q(similar_to__recipe__in=ShoppingCart.objects.filter(
+                    user=user).values("recipe")))
+            .filter(is_favorited=False, is_in_shopping_cart=False)
+            .annotate(recommendation_score=Sum("similar_to__score"))
+            .order_by("-recommendation_score", "-id")
+        )[:settings.RECOMMENDED_RECIPES_LIMIT]
+        serializer = self.get_serializer(recipes, many=True)
+        return Response(serializer.data)
 
     @action(
         detail=True,
@@ -208,6 +611,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
             "recipe",
             "This recipe is not in your favorites.",
             "This recipe is already in your favorites.",
+            counter_field="favorites_count",
         )
 
     @action(
@@ -228,32 +632,91 @@ class RecipeViewSet(viewsets.ModelViewSet):
             "recipe",
             "This recipe is not in your shopping cart.",
             "This recipe is already in your shopping cart.",
+            counter_field="in_carts_count",
+            on_created=ShoppingCartItem.objects.add_recipe,
+            on_deleted=ShoppingCartItem.objects.remove_recipe,
         )
 
-    def _create_shopping_list_file(self, user):
-        recipes = (
-            ShoppingCart.objects
-            .filter(user=user)
-            .values("recipe")
+    def _batch_ids(self, request):
+        validator = BatchIdsValidator(data=request.data)
+        validator.is_valid(raise_exception=True)
+        return validator.validated_data["ids"]
+
+    @action(
+        detail=False,
+        methods=["post", "delete"],
+        url_path="favorite/batch",
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def favorite_batch(self, request):
+        return _handle_batch_relationship_action(
+            request,
+            Favorite,
+            Recipe,
+            self._batch_ids(request),
+            "user",
+            "recipe",
+            counter_field="favorites_count",
+            stamp_field="interactions_changed_at",
+            version=RECIPE_LIST_VERSION,
+        )
+
+    @action(
+        detail=False,
+        methods=["post", "delete"],
+        url_path="shopping_cart/batch",
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def shopping_cart_batch(self, request):
+        return self._change_shopping_cart(request, self._batch_ids(request))
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="shopping_cart/from_favorites",
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def copy_favorites_to_cart(self, request):
+        return self._change_shopping_cart(
+            request,
+            Favorite.objects.filter(user=request.user)
+            .order_by("id").values_list("recipe_id", flat=True),
+        )
+
+    def _change_shopping_cart(self, request, recipe_ids):
+        return _handle_batch_relationship_action(
+            request,
+            ShoppingCart,
+            Recipe,
+            recipe_ids,
+            "user",
+            "recipe",
+            counter_field="in_carts_count",
+            on_created=ShoppingCartItem.objects.add_recipes,
+            on_deleted=ShoppingCartItem.objects.remove_recipes,
+            stamp_field="interactions_changed_at",
+            version=RECIPE_LIST_VERSION,
         )
 
+    def _iter_shopping_list(self, user):
         ingredients = (
-            RecipeIngredient.objects
-            .filter(recipe__in=recipes)
-            .values("ingredient__name", "ingredient__measurement_unit")
+            ShoppingCartItem.objects
+            .filter(user=user)
+            .values("ingredient__name", "ingredient__measurement_unit",
+                    "total_amount")
+            .order_by("ingredient__name")
         )
 
-        ingredients = ingredients.annotate(
-            total_amount=Sum("amount"))
+        separator = ""
+        for ingredient in ingredients.iterator(
+                chunk_size=SHOPPING_LIST_CHUNK_SIZE):
+            yield (f"{separator}{ingredient["ingredient__name"]}: "
+                   f"{int(ingredient["total_amount"])} "
+                   f"({ingredient["ingredient__measurement_unit"]})").encode()
+            separator = "\n"
 
-        if not ingredients.exists():
-            file = "Your shopping cart is empty."
-        else:
-            file = "\n".join(f"{ingredient["ingredient__name"]}: "
-                             f"{int(ingredient["total_amount"])} "
-                             f"({ingredient["ingredient__measurement_unit"]})"
-                             for ingredient in ingredients)
-        return file
+        if not separator:
+            yield b"Your shopping cart is empty."
 
     @action(
         detail=False,
@@ -261,8 +724,19 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=[permissions.IsAuthenticated],
     )
     def download_shopping_cart(self, request):
-        file = self._create_shopping_list_file(request.user)
-        response = HttpResponse(file, content_type="text/plain; charset=utf-8")
-        response["Content-Disposition"] = (
-            "attachment; filename=\"shopping_list.txt\"")
-        return response
+        return streaming_attachment(request,
+                                    self._iter_shopping_list(request.user),
+                                    "text/plain; charset=utf-8",
+                                    "shopping_list.txt")
+
+    @action(
+        detail=False,
+        methods=["get"],
+        permission_classes=[permissions.IsAdminUser],
+    )
+    def export(self, request):
+        inline_images = request.query_params.get("inline_images") in (
+            "1", "true")
+        return streaming_attachment(
+            request, export_recipes(inline_images=inline_images),
+            "application/x-ndjson", "recipes.ndjson")
@@ -0,0 +1,26 @@
+import threading
+from collections import Counter
+
+OUTCOMES = ("hits", "misses")
+
+# Counted in process memory, so recording is free of cache round trips and
+# never loses updates; each worker reports its own numbers since start.
+_lock = threading.Lock()
+_counts = Counter()
+
+
+def record(name, hits=0, misses=0):
+    with _lock:
+        _counts[name, "hits"] += hits
+        _counts[name, "misses"] += misses
+
+
+def get_stats(name):
+    with _lock:
+        hits, misses = (_counts[name, outcome] for outcome in OUTCOMES)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / total if total else None,
+    }
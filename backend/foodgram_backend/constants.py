@@ -7,6 +7,7 @@ INGREDIENT_MEASUREMENT_UNIT_MAX_LENGTH = 64
 
 RECIPE_NAME_MAX_LENGTH = 128
 RECIPE_IMAGE_UPLOAD_PATH = "recipes/images/"
+RECIPE_SEARCH_CONFIG = "russian"
 
 USER_EMAIL_MAX_LENGTH = 254
 USER_USERNAME_MAX_LENGTH = 150
@@ -15,4 +16,19 @@ USER_LAST_NAME_MAX_LENGTH = 150
 USER_AVATAR_PATH = "users/"
 
 SHORT_LINK_LENGTH = 8
+SHORT_LINK_ENCODED_LENGTH = 7
 SHORT_LINK_ALLOWED_CHARS = f"{string.ascii_letters}{string.digits}"
+
+SHOPPING_LIST_CHUNK_SIZE = 2000
+RECIPE_EXPORT_CHUNK_SIZE = 2000
+
+VERSION_CACHE_ALIAS = "versions"
+INGREDIENT_CATALOG_VERSION = "ingredient_catalog"
+RECIPE_LIST_VERSION = "recipe_list"
+USER_PROFILE_VERSION = "user_profile"
+RECIPE_DELETION_VERSION = "recipe_deletion"
+RECIPE_INGREDIENT_INDEX_VERSION = "recipe_ingredient_index"
+AUTH_SNAPSHOT_VERSION = "auth_snapshot"
+
+RECIPE_FRAGMENT_CACHE = "recipe_fragments"
+TOKEN_AUTH_CACHE = "token_auth"
@@ -0,0 +1,176 @@
+import io
+import logging
+from functools import partial
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from .workers import WorkerPool
+
+logger = logging.getLogger(__name__)
+
+VARIANT_FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+# Served as the single image URL; the JPEG copies back the srcset of
+# clients without WebP support.
+DEFAULT_VARIANT_FORMAT = "webp"
+VARIANT_QUALITY = 82
+
+
+def variants_field_name(field_name):
+    return f"{field_name}_variants"
+
+
+def _ready_variants(field_file):
+    variants = getattr(field_file.instance,
+                       variants_field_name(field_file.field.name))
+    if variants.get("source") != field_file.name:
+        return {}
+    return {variant: files for variant, files in variants.items()
+            if variant != "source"}
+
+
+def variant_url(field_file, variant, image_format=DEFAULT_VARIANT_FORMAT):
+    """URL of a resized variant, or of the original until it is ready."""
+    files = _ready_variants(field_file).get(variant, {})
+    if image_format not in files:
+        return field_file.url
+    return field_file.storage.url(files[image_format])
+
+
+def variant_sources(field_file):
+    """Return `{format: [(url, width), ...]}` of the ready variants.
+
+    Sources are ordered by width, as a srcset lists them, and variants of
+    a small original that came out the same width are listed once.
+    Variants made before widths were recorded are left out until
+    regenerated.
+    """
+    variants = {
+        files["width"]: files
+        for files in sorted(
+            (files for files in _ready_variants(field_file).values()
+             if "width" in files),
+            key=lambda files: files["width"])
+    }.values()
+    return {
+        image_format: [(field_file.storage.url(files[image_format]),
+                        files["width"])
+                       for files in variants if image_format in files]
+        for image_format in VARIANT_FORMATS
+    }
+
+
+def _encode(image, image_format):
+    if image_format == "jpeg" and image.mode != "RGB":
+        background = Image.new("RGB", image.size, "white")
+        if "A" in image.getbands():
+            background.paste(image, mask=image.getchannel("A"))
+        else:
+            background.paste(image.convert("RGB"))
+        image = background
+
+    buffer = io.BytesIO()
+    image.save(buffer, VARIANT_FORMATS[image_format],
+               quality=VARIANT_QUALITY)
+    return buffer.getvalue()
+
+
+def render_variants(field_file, sizes):
+    """Save resized, EXIF-free copies of the image next to the original.
+
+    Every variant is saved in all VARIANT_FORMATS; the returned mapping
+    records the storage names and the width of each variant along with
+    the source they were made from.
+    """
+    with field_file.open("rb"), Image.open(field_file) as original:
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ("RGB", "RGBA"):
+            transparent = ("A" in original.getbands()
+                           or "transparency" in original.info)
+            original = original.convert("RGBA" if transparent else "RGB")
+
+        source = PurePosixPath(field_file.name)
+        variants = {"source": field_file.name}
+        for variant, size in sizes.items():
+            image = original.copy()
+            image.thumbnail((size, size), Image.Resampling.LANCZOS)
+            variants[variant] = {
+                image_format: field_file.storage.save(
+                    str(source.parent / "variants"
+                        / f"{source.stem}_{variant}.{image_format}"),
+                    ContentFile(_encode(image, image_format)))
+                for image_format in VARIANT_FORMATS
+            }
+            variants[variant]["width"] = image.width
+    return variants
+
+
+def _variant_names(variants):
+    return {files[image_format]
+            for variant, files in variants.items() if variant != "source"
+            for image_format in VARIANT_FORMATS if image_format in files}
+
+
+def generate_variants(model, pk, field_name, sizes):
+    """Render the variants of one object's image and record them.
+
+    The result is saved only if the image has not changed in the meantime,
+    and the files of the replaced variants are removed afterwards.
+    """
+    variants_field = variants_field_name(field_name)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return
+
+    field_file = getattr(instance, field_name)
+    variants = render_variants(field_file, sizes) if field_file else {}
+
+    with transaction.atomic():
+        current = model.objects.select_for_update().filter(pk=pk).first()
+        if current is None or getattr(current, field_name) != field_file:
+            stale = variants
+        else:
+            stale = getattr(current, variants_field)
+            setattr(current, variants_field, variants)
+            current.save(update_fields=[
+                variants_field,
+                *(field.name for field in model._meta.concrete_fields
+                  if getattr(field, "auto_now", False)),
+            ])
+
+    storage = field_file.storage
+    for name in _variant_names(stale) - _variant_names(variants):
+        storage.delete(name)
+
+
+variant_pool = WorkerPool("image-variants", settings.IMAGE_VARIANT_WORKERS,
+                          settings.IMAGE_VARIANT_QUEUE_SIZE)
+
+
+def _submit_variant_job(job):
+    # A dropped job leaves the original image in use until the
+    # `generate_image_variants` command is run.
+    if not variant_pool.submit(job):
+        logger.warning("Image variant queue is full, job dropped")
+
+
+def schedule_variants(instance, field_name, sizes):
+    """Queue variant generation once the current transaction commits.
+
+    Nothing is queued when the recorded variants already match the image.
+    """
+    field_file = getattr(instance, field_name)
+    variants = getattr(instance, variants_field_name(field_name))
+    if field_file:
+        up_to_date = variants.get("source") == field_file.name
+    else:
+        up_to_date = not variants
+    if up_to_date:
+        return
+
+    job = partial(generate_variants, type(instance), instance.pk,
+                  field_name, sizes)
+    transaction.on_commit(partial(_submit_variant_job, job))
@@ -0,0 +1,95 @@
+from django.db import connections
+from django.db.models.signals import post_delete, post_save
+
+
+def _prepare(model, rows, connection):
+    fields = [model._meta.get_field(name) for name in rows[0]]
+    params = [
+        field.get_db_prep_save(getattr(value, "pk", value), connection)
+        for row in rows for field, value in zip(fields, row.values())
+    ]
+    placeholder = f"({', '.join(['%s'] * len(fields))})"
+    return fields, params, ", ".join([placeholder] * len(rows))
+
+
+def _instances(model, fields, returned, connection):
+    for pk, *values in returned:
+        instance = model(pk=pk, **{field.attname: value
+                                   for field, value in zip(fields, values)})
+        instance._state.adding = False
+        instance._state.db = connection.alias
+        yield instance
+
+
+def create_relations(model, rows, send_signals=True):
+    """Insert link rows, skipping the ones that already exist.
+
+    `rows` are dicts with the same field names. A single
+    `INSERT ... ON CONFLICT DO NOTHING RETURNING` both creates the rows and
+    reports which ones were new, so concurrent requests cannot race into
+    an IntegrityError. Returns the new instances; post_save is sent for
+    each of them as Model.save() would, unless `send_signals` is false and
+    the caller applies the side effects for the whole batch itself.
+    """
+    if not rows:
+        return []
+
+    connection = connections[model.objects.db]
+    quote = connection.ops.quote_name
+    fields, params, values = _prepare(model, rows, connection)
+    columns = ", ".join(quote(field.column) for field in fields)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {quote(model._meta.db_table)} ({columns}) "
+            f"VALUES {values} ON CONFLICT DO NOTHING "
+            f"RETURNING {quote(model._meta.pk.column)}, {columns}", params)
+        returned = cursor.fetchall()
+
+    created = list(_instances(model, fields, returned, connection))
+    if send_signals:
+        for instance in created:
+            post_save.send(sender=model, instance=instance, created=True,
+                           update_fields=None, raw=False,
+                           using=connection.alias)
+    return created
+
+
+def delete_relations(model, rows, send_signals=True):
+    """Delete link rows with one `DELETE ... RETURNING` statement.
+
+    Returns the deleted instances, and sends post_delete for them so
+    receivers see the same events as with Model.delete(), unless
+    `send_signals` is false. Link models must not be the target of
+    cascading foreign keys.
+    """
+    if not rows:
+        return []
+
+    connection = connections[model.objects.db]
+    quote = connection.ops.quote_name
+    fields, params, values = _prepare(model, rows, connection)
+    columns = ", ".join(quote(field.column) for field in fields)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {quote(model._meta.db_table)} "
+            f"WHERE ({columns}) IN ({values}) "
+            f"RETURNING {quote(model._meta.pk.column)}, {columns}", params)
+        returned = cursor.fetchall()
+
+    deleted = list(_instances(model, fields, returned, connection))
+    if send_signals:
+        for instance in deleted:
+            post_delete.send(sender=model, instance=instance,
+                             using=connection.alias, origin=instance)
+    return deleted
+
+
+def create_relation(model, **values):
+    """Insert one link row; returns None when it already existed."""
+    created = create_relations(model, [values])
+    return created[0] if created else None
+
+
+def delete_relation(model, **values):
+    """Delete one link row; returns whether it existed."""
+    return bool(delete_relations(model, [values]))
@@ -1,7 +1,7 @@
 import os
 from pathlib import Path
 
-from .constants import DEFAULT_PAGE_SIZE
+from .constants import DEFAULT_PAGE_SIZE, VERSION_CACHE_ALIAS
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -22,6 +22,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework.authtoken",
     "rest_framework",
     "djoser",
@@ -38,6 +39,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "foodgram_backend.versions.VersionSnapshotMiddleware",
 ]
 
 ROOT_URLCONF = "foodgram_backend.urls"
@@ -70,6 +72,26 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.getenv("CACHE_MAX_ENTRIES", "50000")),
+        },
+    },
+    VERSION_CACHE_ALIAS: {
+        "BACKEND": os.getenv(
+            "VERSION_CACHE_BACKEND",
+            "django.core.cache.backends.db.DatabaseCache"),
+        "LOCATION": os.getenv("VERSION_CACHE_LOCATION", "foodgram_versions"),
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.getenv("VERSION_CACHE_MAX_ENTRIES", "5000")),
+        },
+    },
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": ("django.contrib.auth.password_validation."
@@ -110,7 +132,7 @@ REST_FRAMEWORK = {
         "rest_framework.permissions.IsAuthenticatedOrReadOnly",
     ],
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "users.authentication.CachedTokenAuthentication",
     ],
     "DEFAULT_PAGINATION_CLASS":
     ("rest_framework.pagination.PageNumberPagination"),
@@ -131,3 +153,38 @@ DJOSER = {
         "user_list": ["rest_framework.permissions.IsAuthenticatedOrReadOnly"],
     },
 }
+
+INGREDIENT_SEARCH_LIMIT = int(os.getenv("INGREDIENT_SEARCH_LIMIT", "0")) or None
+
+COUNT_CACHE_TIMEOUT = int(os.getenv("COUNT_CACHE_TIMEOUT", "30"))
+COUNT_ESTIMATE_THRESHOLD = int(os.getenv("COUNT_ESTIMATE_THRESHOLD", "100000"))
+RECIPE_FRAGMENT_CACHE_TIMEOUT = int(
+    os.getenv("RECIPE_FRAGMENT_CACHE_TIMEOUT", "3600"))
+
+INGREDIENT_MATCH_LIMIT = int(os.getenv("INGREDIENT_MATCH_LIMIT", "1000"))
+
+RECIPE_NEIGHBOURS_COUNT = int(os.getenv("RECIPE_NEIGHBOURS_COUNT", "20"))
+RECOMMENDED_RECIPES_LIMIT = int(os.getenv("RECOMMENDED_RECIPES_LIMIT", "20"))
+
+SHORT_LINK_CACHE_SIZE = int(os.getenv("SHORT_LINK_CACHE_SIZE", "10000"))
+
+IMAGE_UPLOAD_MAX_SIZE = int(os.getenv("IMAGE_UPLOAD_MAX_SIZE", "10485760"))
+
+RECIPE_IMAGE_VARIANTS = {"card": 480, "detail": 1200}
+AVATAR_VARIANTS = {"avatar": 256}
+IMAGE_VARIANT_WORKERS = int(os.getenv("IMAGE_VARIANT_WORKERS", "2"))
+IMAGE_VARIANT_QUEUE_SIZE = int(os.getenv("IMAGE_VARIANT_QUEUE_SIZE", "100"))
+
+FEED_MAX_ENTRIES = int(os.getenv("FEED_MAX_ENTRIES", "500"))
+FEED_FANOUT_MAX_SUBSCRIBERS = int(
+    os.getenv("FEED_FANOUT_MAX_SUBSCRIBERS", "10000"))
+FEED_FANOUT_HYSTERESIS = int(os.getenv("FEED_FANOUT_HYSTERESIS", "1000"))
+FEED_FANOUT_WORKERS = int(os.getenv("FEED_FANOUT_WORKERS", "1"))
+FEED_FANOUT_QUEUE_SIZE = int(os.getenv("FEED_FANOUT_QUEUE_SIZE", "1000"))
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+
+TOKEN_AUTH_CACHE_TIMEOUT = int(os.getenv("TOKEN_AUTH_CACHE_TIMEOUT", "300"))
+TOKEN_AUTH_CACHE_SIZE = int(os.getenv("TOKEN_AUTH_CACHE_SIZE", "10000"))
+
+VERSION_STAMP_MAX_AGE = float(os.getenv("VERSION_STAMP_MAX_AGE", "1"))
@@ -0,0 +1,114 @@
+import contextvars
+import time
+from datetime import UTC, datetime
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+
+from .constants import VERSION_CACHE_ALIAS
+
+VERSION_KEY_PREFIX = "version:"
+# Stamps are bumped by management commands as well as by web workers, so
+# they only work in a cache that every process shares.
+PROCESS_LOCAL_CACHES = (
+    "django.core.cache.backends.dummy.DummyCache",
+    "django.core.cache.backends.locmem.LocMemCache",
+)
+
+# Stamps already read by the current request, so that every structure
+# consulted while serving it sees the same versions for one cache read.
+_request_versions = contextvars.ContextVar("request_versions", default=None)
+# The latest read of each stamp in this process, as (version, read_at).
+_recent_versions = {}
+
+
+def _initial_version():
+    # A fresh stamp after a cache flush must never collide with a stale one.
+    return time.time_ns()
+
+
+def _remember(name, version):
+    _recent_versions[name] = (version, time.monotonic())
+    memo = _request_versions.get()
+    if memo is not None:
+        memo[name] = version
+
+
+def get_version(name, max_age=None):
+    """Return the current stamp of `name`.
+
+    A request reads each stamp from the shared cache at most once.
+    Process-local structures that tolerate a briefly stale stamp pass
+    `max_age` in seconds to reuse any read that recent instead.
+    """
+    memo = _request_versions.get()
+    if memo is not None and name in memo:
+        return memo[name]
+    if max_age is not None and name in _recent_versions:
+        version, read_at = _recent_versions[name]
+        if time.monotonic() - read_at < max_age:
+            return version
+
+    cache = caches[VERSION_CACHE_ALIAS]
+    key = VERSION_KEY_PREFIX + name
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), timeout=None)
+        version = cache.get(key)
+    _remember(name, version)
+    return version
+
+
+def bump_version(name, timed=False):
+    """Move the stamp of `name` on and return the new value.
+
+    Stamps count up by one, which change logs keyed by consecutive
+    versions rely on. A `timed` stamp instead jumps to at least the
+    current time in nanoseconds, so version_time() tells when it was last
+    bumped.
+    """
+    cache = caches[VERSION_CACHE_ALIAS]
+    key = VERSION_KEY_PREFIX + name
+    try:
+        delta = 1
+        if timed:
+            delta = max(time.time_ns() - (cache.get(key) or 0), 1)
+        version = cache.incr(key, delta)
+    except ValueError:
+        cache.add(key, _initial_version(), timeout=None)
+        version = cache.get(key)
+    _remember(name, version)
+    return version
+
+
+def version_time(version):
+    """Time a timed stamp was last bumped, or first read, at the latest."""
+    return datetime.fromtimestamp(version / 1e9, tz=UTC)
+
+
+class VersionSnapshotMiddleware:
+    """Scope the per-request memo of version stamps to each request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _request_versions.set({})
+        try:
+            return self.get_response(request)
+        finally:
+            _request_versions.reset(token)
+
+
+def check_shared_cache(app_configs, **kwargs):
+    backend = settings.CACHES[VERSION_CACHE_ALIAS]["BACKEND"]
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+
+    return [checks.Warning(
+        f"{backend} is private to each process, so version stamps bumped "
+        "by other workers or management commands are not seen.",
+        hint="Set VERSION_CACHE_BACKEND to a cache shared by all processes.",
+        id="foodgram_backend.W001",
+    )]
@@ -0,0 +1,49 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPool:
+    """Bounded thread pool running jobs outside the request.
+
+    At most `queue_size` jobs are pending at once; `submit` refuses the
+    extra ones and returns False, leaving the caller to drop or run them.
+    With `workers` set to 0 jobs run inline.
+    """
+
+    def __init__(self, name, workers, queue_size):
+        self.name = name
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(queue_size)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix=self.name)
+            return self._executor
+
+    def _run(self, job):
+        try:
+            job()
+        except Exception:
+            logger.exception("Job of the %s pool failed", self.name)
+        finally:
+            connection.close()
+            self._slots.release()
+
+    def submit(self, job):
+        if self.workers == 0:
+            job()
+            return True
+
+        if not self._slots.acquire(blocking=False):
+            return False
+        self._get_executor().submit(self._run, job)
+        return True
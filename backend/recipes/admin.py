@@ -1,7 +1,13 @@
 from django.contrib import admin
 
-from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                     ShoppingCart)
+from .models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    ShoppingCartItem,
+)
 
 
 class RecipeIngredientInline(admin.TabularInline):
@@ -18,11 +24,6 @@ class RecipeAdmin(admin.ModelAdmin):
     list_filter = ("author", )
     inlines = [RecipeIngredientInline]
 
-    def favorites_count(self, recipe):
-        return recipe.favorited_by.count()
-
-    favorites_count.short_description = "Кол-во добавлений в избранное"
-
 
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
@@ -50,3 +51,10 @@ class FavoriteAdmin(admin.ModelAdmin):
     list_display = ("id", "user", "recipe")
     list_filter = ("user", )
     search_fields = ("user__username", "recipe__name")
+
+
+@admin.register(ShoppingCartItem)
+class ShoppingCartItemAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "ingredient", "total_amount")
+    list_filter = ("user", )
+    search_fields = ("user__username", "ingredient__name")
@@ -0,0 +1,107 @@
+import bisect
+import threading
+
+from django.conf import settings
+from foodgram_backend.constants import INGREDIENT_CATALOG_VERSION
+from foodgram_backend.versions import bump_version, get_version
+
+from .models import Ingredient
+
+
+class IngredientIndex:
+    """Process-local, case-folded prefix index over the ingredient catalog.
+
+    Ingredients are kept in a sorted array of folded names, so a prefix
+    lookup is a binary search followed by a short scan, and in a dict of
+    `(name, measurement_unit)` keyed by id for validation and rendering.
+    The index reloads itself whenever the shared catalog version stamp
+    changes, checking it at most every VERSION_STAMP_MAX_AGE seconds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._entries = ([], [], {})
+
+    def _load(self):
+        ingredients = sorted(
+            Ingredient.objects.values_list("id", "name", "measurement_unit"),
+            key=lambda row: (row[1].casefold(), row[1], row[0]),
+        )
+        keys = [name.casefold() for _, name, _ in ingredients]
+        rows = [{"id": id, "name": name, "measurement_unit": unit}
+                for id, name, unit in ingredients]
+        by_id = {id: (name, unit) for id, name, unit in ingredients}
+        return keys, rows, by_id
+
+    def _ensure_fresh(self):
+        version = get_version(INGREDIENT_CATALOG_VERSION,
+                              max_age=settings.VERSION_STAMP_MAX_AGE)
+        if version == self._version:
+            return
+
+        with self._lock:
+            if version != self._version:
+                self._entries = self._load()
+                self._version = version
+
+    def search(self, prefix, limit=None):
+        self._ensure_fresh()
+        keys, rows, _ = self._entries
+
+        prefix = prefix.casefold()
+        start = bisect.bisect_left(keys, prefix)
+        end = start
+        while end < len(keys) and keys[end].startswith(prefix):
+            end += 1
+            if limit is not None and end - start >= limit:
+                break
+
+        return rows[start:end]
+
+    def _resolve(self, ingredient_ids):
+        """Look up ids the loaded catalog lacks, and keep the ones found.
+
+        An ingredient added by a process whose version bump has not
+        reached this one yet is read from the database instead of failing.
+        Returns the ids that do not exist at all.
+        """
+        unknown = [id for id in ingredient_ids
+                   if id not in self._entries[2]]
+        if not unknown:
+            return []
+
+        found = {
+            id: (name, unit) for id, name, unit in
+            Ingredient.objects.filter(pk__in=unknown)
+            .values_list("id", "name", "measurement_unit")
+        }
+        if found:
+            with self._lock:
+                keys, rows, by_id = self._entries
+                self._entries = (keys, rows, {**by_id, **found})
+        return [id for id in unknown if id not in found]
+
+    def lookup(self, ingredient_ids):
+        """Return `{id: (name, measurement_unit)}` of the ids that exist."""
+        self._ensure_fresh()
+        self._resolve(ingredient_ids)
+        by_id = self._entries[2]
+        return {id: by_id[id] for id in ingredient_ids if id in by_id}
+
+    def get(self, ingredient_id):
+        """Return `(name, measurement_unit)` of an ingredient, or None."""
+        return self.lookup([ingredient_id]).get(ingredient_id)
+
+    def missing(self, ingredient_ids):
+        """Return the given ids that are not in the catalog, in order."""
+        self._ensure_fresh()
+        return self._resolve(ingredient_ids)
+
+
+ingredient_index = IngredientIndex()
+
+
+def invalidate_ingredient_catalog():
+    # Timed, so that anonymous recipe pages can derive Last-Modified.
+    bump_version(INGREDIENT_CATALOG_VERSION, timed=True)
@@ -0,0 +1,234 @@
+import bisect
+import heapq
+import itertools
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from foodgram_backend.constants import (
+    RECIPE_INGREDIENT_INDEX_VERSION,
+    VERSION_CACHE_ALIAS,
+)
+from foodgram_backend.versions import bump_version, get_version
+
+from .models import RecipeIngredient
+
+CHANGE_KEY_PREFIX = "recipe_ingredient_change:"
+CHANGE_TIMEOUT = 60 * 60
+MAX_PENDING_CHANGES = 500
+LOAD_CHUNK_SIZE = 10_000
+EMPTY_POSTING = b""
+
+
+def _encode_varints(values):
+    """Pack non-negative ints in 7-bit groups, low group first."""
+    data = bytearray()
+    for value in values:
+        while value >= 0x80:
+            data.append(value & 0x7F | 0x80)
+            value >>= 7
+        data.append(value)
+    return bytes(data)
+
+
+def _decode_varints(data):
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            yield value
+            value = shift = 0
+
+
+def _encode_posting(ids):
+    """Delta/varint-encode sorted ids, so close ids take a byte each."""
+    return _encode_varints(
+        current - previous
+        for previous, current in itertools.pairwise([0, *ids]))
+
+
+def _decode_posting(data):
+    return list(itertools.accumulate(_decode_varints(data)))
+
+
+def _encode_recipe(ingredient_ids):
+    # The ingredient count leads, so ranking reads it without decoding.
+    return (_encode_varints([len(ingredient_ids)])
+            + _encode_posting(sorted(ingredient_ids)))
+
+
+def _recipe_size(entry):
+    return next(_decode_varints(entry))
+
+
+def _recipe_ingredients(entry):
+    return frozenset(itertools.accumulate(
+        itertools.islice(_decode_varints(entry), 1, None)))
+
+
+class RecipeIngredientIndex:
+    """Process-local inverted index from ingredients to recipes.
+
+    Every ingredient maps to its sorted recipe ids, delta/varint-encoded
+    into bytes, and every recipe to its ingredient count and sorted
+    ingredient ids in the same encoding. Ids of recipes created close
+    together differ little, so a posting takes one or two bytes per
+    recipe, and postings are decoded only for the ingredients a query
+    names. Writers publish the ids of the recipes they changed under a
+    new version stamp; other processes reload just those recipes, and
+    rebuild the whole index only when a change is missing from the cache
+    or too many have piled up.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._postings = {}
+        self._recipes = {}
+
+    def _load(self):
+        postings, recipes = {}, {}
+        rows = (RecipeIngredient.objects
+                .order_by("ingredient_id", "recipe_id")
+                .values_list("ingredient_id", "recipe_id")
+                .iterator(chunk_size=LOAD_CHUNK_SIZE))
+        for ingredient_id, group in itertools.groupby(
+                rows, key=lambda row: row[0]):
+            recipe_ids = [recipe_id for _, recipe_id in group]
+            postings[ingredient_id] = _encode_posting(recipe_ids)
+            for recipe_id in recipe_ids:
+                recipes.setdefault(recipe_id, []).append(ingredient_id)
+
+        self._postings = postings
+        self._recipes = {recipe_id: _encode_recipe(ingredient_ids)
+                         for recipe_id, ingredient_ids in recipes.items()}
+
+    def _update_posting(self, ingredient_id, recipe_id, add):
+        # Postings are replaced rather than mutated, so concurrent readers
+        # always see a consistent one.
+        posting = _decode_posting(
+            self._postings.get(ingredient_id, EMPTY_POSTING))
+        position = bisect.bisect_left(posting, recipe_id)
+        present = (position < len(posting)
+                   and posting[position] == recipe_id)
+        if add and not present:
+            posting.insert(position, recipe_id)
+        elif not add and present:
+            del posting[position]
+        self._postings[ingredient_id] = _encode_posting(posting)
+
+    def _reload_recipes(self, recipe_ids):
+        current = dict.fromkeys(recipe_ids, frozenset())
+        rows = (RecipeIngredient.objects
+                .filter(recipe_id__in=recipe_ids)
+                .values_list("recipe_id", "ingredient_id"))
+        for recipe_id, group in itertools.groupby(
+                sorted(rows), key=lambda row: row[0]):
+            current[recipe_id] = frozenset(
+                ingredient_id for _, ingredient_id in group)
+
+        for recipe_id, ingredient_ids in current.items():
+            entry = self._recipes.get(recipe_id)
+            previous = (_recipe_ingredients(entry) if entry is not None
+                        else frozenset())
+            for ingredient_id in previous - ingredient_ids:
+                self._update_posting(ingredient_id, recipe_id, add=False)
+            for ingredient_id in ingredient_ids - previous:
+                self._update_posting(ingredient_id, recipe_id, add=True)
+
+            if ingredient_ids:
+                self._recipes[recipe_id] = _encode_recipe(ingredient_ids)
+            else:
+                self._recipes.pop(recipe_id, None)
+
+    def _pending_changes(self, version):
+        if self._version is None or version - self._version < 0:
+            return None
+        if version - self._version > MAX_PENDING_CHANGES:
+            return None
+
+        keys = [f"{CHANGE_KEY_PREFIX}{number}"
+                for number in range(self._version + 1, version + 1)]
+        changes = caches[VERSION_CACHE_ALIAS].get_many(keys)
+        if len(changes) != len(keys):
+            return None
+        return {recipe_id for key in keys for recipe_id in changes[key]}
+
+    def _ensure_fresh(self):
+        version = get_version(RECIPE_INGREDIENT_INDEX_VERSION,
+                              max_age=settings.VERSION_STAMP_MAX_AGE)
+        if version == self._version:
+            return
+
+        with self._lock:
+            if version == self._version:
+                return
+
+            changed_recipe_ids = self._pending_changes(version)
+            if changed_recipe_ids is None:
+                self._load()
+            else:
+                self._reload_recipes(changed_recipe_ids)
+            self._version = version
+
+    def match(self, ingredient_ids, mode="any", max_missing=None,
+              limit=None):
+        """Return recipe ids matching the ingredients, best coverage first.
+
+        With `mode="all"` a recipe must use every given ingredient, with
+        `mode="any"` at least one of them. `max_missing` instead selects
+        the recipes that need at most that many other ingredients.
+        Coverage is the share of a recipe's ingredients that were given.
+        """
+        self._ensure_fresh()
+        recipes = self._recipes
+        postings = sorted(
+            (_decode_posting(
+                self._postings.get(ingredient_id, EMPTY_POSTING))
+             for ingredient_id in set(ingredient_ids)),
+            key=len)
+        if not postings:
+            return []
+
+        if mode == "all" and max_missing is None:
+            matched = dict.fromkeys(
+                set(postings[0]).intersection(*postings[1:]), len(postings))
+        else:
+            matched = Counter(itertools.chain.from_iterable(postings))
+
+        sizes = {recipe_id: _recipe_size(recipes[recipe_id])
+                 for recipe_id in matched if recipe_id in recipes}
+        if max_missing is not None:
+            matched = {
+                recipe_id: count for recipe_id, count in matched.items()
+                if recipe_id in sizes
+                and sizes[recipe_id] - count <= max_missing
+            }
+
+        def rank(recipe_id):
+            size = sizes.get(recipe_id) or 1
+            count = matched[recipe_id]
+            return (-count / size, size - count, -recipe_id)
+
+        if limit is None:
+            return sorted(matched, key=rank)
+        return heapq.nsmallest(limit, matched, key=rank)
+
+
+recipe_ingredient_index = RecipeIngredientIndex()
+
+
+def recipe_ingredients_changed(recipe_ids):
+    """Publish that the ingredient sets of these recipes were rewritten."""
+    version = bump_version(RECIPE_INGREDIENT_INDEX_VERSION)
+    # Changes live next to the stamps, in the cache every process shares.
+    caches[VERSION_CACHE_ALIAS].set(
+        f"{CHANGE_KEY_PREFIX}{version}", list(recipe_ids), CHANGE_TIMEOUT)
+
+
+def invalidate_recipe_ingredient_index():
+    # A version without a published change makes every process rebuild.
+    bump_version(RECIPE_INGREDIENT_INDEX_VERSION)
@@ -0,0 +1,105 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+
+
+class Rollback(Exception):
+    pass
+
+
+def rewrite_ingredients(recipe, amounts):
+    """The previous update path: drop every row and insert them again.
+
+    The amounts were read before and after the rewrite to update the
+    shopping carts.
+    """
+    old_amounts = recipe.ingredient_amounts()
+    RecipeIngredient.objects.filter(recipe=recipe).delete()
+    RecipeIngredient.objects.bulk_create([
+        RecipeIngredient(recipe=recipe, ingredient_id=ingredient_id,
+                         amount=amount)
+        for ingredient_id, amount in amounts.items()
+    ])
+    recipe.ingredient_amounts()
+    return len(old_amounts) + len(amounts)
+
+
+def diff_ingredients(recipe, amounts):
+    old_amounts = recipe.set_ingredient_amounts(amounts)
+    return sum(old_amounts.get(ingredient_id) != amounts.get(ingredient_id)
+               for ingredient_id in old_amounts.keys() | amounts.keys())
+
+
+STRATEGIES = (
+    ("rewrite", rewrite_ingredients),
+    ("diff", diff_ingredients),
+)
+
+
+class Command(BaseCommand):
+    help = ("Compare rows written and latency of rewriting versus diffing "
+            "recipe ingredients on typical edits. Every edit is rolled "
+            "back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--samples", type=int, default=200)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def _edit(self, amounts, ingredient_ids, rng):
+        """Change one amount, or sometimes add or drop an ingredient."""
+        amounts = dict(amounts)
+        kind = rng.choices(("change", "add", "remove"), (6, 2, 2))[0]
+        if kind == "remove" and len(amounts) > 1:
+            del amounts[rng.choice(list(amounts))]
+        elif kind == "add":
+            ingredient_id = rng.choice(ingredient_ids)
+            amounts.setdefault(ingredient_id, rng.randint(1, 500))
+        else:
+            ingredient_id = rng.choice(list(amounts))
+            amounts[ingredient_id] = amounts[ingredient_id] % 500 + 1
+        return amounts
+
+    def _run(self, strategy, recipe, amounts):
+        try:
+            with transaction.atomic():
+                started = time.perf_counter()
+                written = strategy(recipe, amounts)
+                elapsed = time.perf_counter() - started
+                raise Rollback
+        except Rollback:
+            pass
+        return written, elapsed
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        recipes = list(
+            Recipe.objects
+            .filter(pk__in=RecipeIngredient.objects.values("recipe"))
+            .order_by("?")[:options["samples"]])
+        if not recipes:
+            raise CommandError("There are no recipes with ingredients.")
+        ingredient_ids = list(Ingredient.objects.values_list("id", flat=True))
+
+        results = {name: ([], []) for name, _ in STRATEGIES}
+        for recipe in recipes:
+            amounts = self._edit(recipe.ingredient_amounts(), ingredient_ids,
+                                 rng)
+            for name, strategy in STRATEGIES:
+                written, elapsed = self._run(strategy, recipe, amounts)
+                results[name][0].append(written)
+                results[name][1].append(elapsed * 1000)
+
+        self.stdout.write(f"{len(recipes)} edits")
+        for name, (rows, timings) in results.items():
+            p50 = statistics.median(timings)
+            p95 = (statistics.quantiles(timings, n=20)[-1]
+                   if len(timings) > 1 else timings[0])
+            self.stdout.write(
+                f"{name}: {sum(rows)} rows written "
+                f"({sum(rows) / len(rows):.1f} per edit), "
+                f"p50 {p50:.2f} ms, p95 {p95:.2f} ms")
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.recommendations import build_neighbours, stale_recipe_ids
+
+
+class Command(BaseCommand):
+    help = ("Precompute the most similar recipes of every recipe from the "
+            "favorites and shopping carts.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Only recompute recipes whose favorites or shopping cart "
+                 "entries changed since their last computation.",
+        )
+        parser.add_argument("--top-k", type=int,
+                            default=settings.RECIPE_NEIGHBOURS_COUNT)
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        if options["incremental"]:
+            recipe_ids = list(stale_recipe_ids())
+        else:
+            recipe_ids = list(Recipe.objects.values_list("id", flat=True))
+
+        computed = build_neighbours(recipe_ids, options["top_k"],
+                                    options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Computed neighbours of {computed} recipes."))
@@ -0,0 +1,36 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from recipes.ndjson import export_recipes
+
+
+class Command(BaseCommand):
+    help = ("Export recipes as NDJSON, one recipe with its author reference "
+            "and ingredients per line.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path",
+            nargs="?",
+            help="Output file; the lines are written to stdout if omitted.",
+        )
+        parser.add_argument(
+            "--inline-images",
+            action="store_true",
+            help="Embed the image files as base64 instead of their paths.",
+        )
+
+    def handle(self, *args, **options):
+        lines = export_recipes(inline_images=options["inline_images"])
+        if options["path"] is None:
+            sys.stdout.buffer.writelines(lines)
+            return
+
+        count = 0
+        with open(options["path"], "wb") as file:
+            for line in lines:
+                file.write(line)
+                count += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Exported {count} recipes."))
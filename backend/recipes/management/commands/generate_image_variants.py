@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from foodgram_backend.image_variants import (
+    generate_variants,
+    variants_field_name,
+)
+from users.models import User
+
+from recipes.models import Recipe
+
+IMAGE_FIELDS = (
+    (Recipe, "image", "RECIPE_IMAGE_VARIANTS"),
+    (User, "avatar", "AVATAR_VARIANTS"),
+)
+
+
+class Command(BaseCommand):
+    help = ("Generate the resized variants of recipe images and avatars "
+            "that are missing or were made from a replaced image.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Regenerate the variants of every image.",
+        )
+
+    def handle(self, *args, **options):
+        for model, field_name, sizes_setting in IMAGE_FIELDS:
+            objects = (
+                model.objects
+                .exclude(**{field_name: ""})
+                .exclude(**{f"{field_name}__isnull": True})
+                .values_list("pk", field_name,
+                             variants_field_name(field_name))
+            )
+
+            generated = 0
+            for pk, name, variants in objects.iterator():
+                if not options["force"] and variants.get("source") == name:
+                    continue
+                try:
+                    generate_variants(model, pk, field_name,
+                                      getattr(settings, sizes_setting))
+                except OSError as error:
+                    self.stderr.write(f"{model._meta.model_name} {pk}: "
+                                      f"{error}")
+                    continue
+                generated += 1
+
+            self.stdout.write(self.style.SUCCESS(
+                f"{model._meta.model_name}.{field_name}: "
+                f"{generated} generated"))
@@ -0,0 +1,65 @@
+import itertools
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import ImportCheckpoint
+from recipes.ndjson import RecipeImporter
+
+
+class Command(BaseCommand):
+    help = ("Import recipes from an NDJSON export. Every batch is committed "
+            "separately together with a checkpoint row, so an interrupted "
+            "import resumes after the last committed batch when rerun.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--checkpoint",
+            help="Checkpoint name, the absolute path of the file by default.",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore an existing checkpoint and import from the start.",
+        )
+
+    def read_lines(self, file, start):
+        for number, line in enumerate(itertools.islice(file, start, None),
+                                      start + 1):
+            if not line.strip():
+                continue
+            try:
+                yield number, json.loads(line)
+            except ValueError as error:
+                raise CommandError(f"Line {number}: {error}")
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        checkpoint = options["checkpoint"] or str(path.resolve())
+        checkpoints = ImportCheckpoint.objects.filter(source=checkpoint)
+
+        if options["restart"]:
+            checkpoints.delete()
+        done = checkpoints.values_list("line", flat=True).first() or 0
+        if done:
+            self.stdout.write(f"Resuming after line {done}.")
+
+        importer = RecipeImporter(checkpoint)
+        created = 0
+        with open(path, encoding="utf-8") as file:
+            batches = itertools.batched(self.read_lines(file, done),
+                                        options["batch_size"])
+            for batch in batches:
+                numbers, lines = zip(*batch)
+                created += importer.import_batch(lines, numbers[-1])
+
+        checkpoints.delete()
+        if importer.skipped:
+            self.stderr.write(f"Skipped {importer.skipped} recipes of "
+                              "unknown authors.")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {created} recipes. Run generate_image_variants to "
+            "build their image variants."))
@@ -0,0 +1,157 @@
+import csv
+import io
+import itertools
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from recipes.catalog import invalidate_ingredient_catalog
+from recipes.models import Ingredient
+
+DEFAULT_PATH = settings.BASE_DIR / "recipes" / "fixtures" / "ingredients.csv"
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if not row:
+            continue
+        if len(row) != 2:
+            raise CommandError(f"Malformed CSV row: {row}")
+        yield row[0], row[1]
+
+
+def read_json(file):
+    """Stream the objects of a top-level JSON array one by one.
+
+    Both plain `{"name", "measurement_unit"}` objects and Django fixture
+    entries with a `fields` key are accepted.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    started = False
+
+    while True:
+        chunk = file.read(READ_CHUNK_SIZE)
+        buffer = buffer[position:] + chunk
+        position = 0
+
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if not started and buffer[position:position + 1] == "[":
+                started = True
+                position += 1
+                continue
+            if buffer[position:position + 1] == "]" or position == len(buffer):
+                break
+
+            try:
+                obj, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise
+                break
+
+            fields = obj.get("fields", obj)
+            yield fields["name"], fields["measurement_unit"]
+
+        if not chunk:
+            return
+
+
+class RowStream(io.TextIOBase):
+    """File-like object that renders rows as tab-separated COPY input."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.buffer = ""
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.buffer += "\t".join(
+                value.replace("\\", "\\\\").replace("\t", "\\t")
+                .replace("\n", "\\n").replace("\r", "\\r")
+                for value in row) + "\n"
+
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+class Command(BaseCommand):
+    help = ("Load the ingredient catalog from CSV or JSON files. Already "
+            "existing (name, measurement_unit) pairs are skipped.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="*", default=[DEFAULT_PATH])
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def read_rows(self, paths):
+        for path in map(Path, paths):
+            if path.suffix not in (".csv", ".json"):
+                raise CommandError(f"Unsupported file format: {path}")
+
+            reader = read_csv if path.suffix == ".csv" else read_json
+            with open(path, encoding="utf-8", newline="") as file:
+                for name, measurement_unit in reader(file):
+                    name, measurement_unit = (name.strip(),
+                                              measurement_unit.strip())
+                    if name and measurement_unit:
+                        yield name, measurement_unit
+
+    def copy_rows(self, cursor, rows):
+        table = Ingredient._meta.db_table
+        cursor.execute(
+            "CREATE TEMPORARY TABLE ingredient_staging "
+            "(name text, measurement_unit text) ON COMMIT DROP")
+
+        copy_sql = ("COPY ingredient_staging (name, measurement_unit) "
+                    "FROM STDIN")
+        if hasattr(cursor.cursor, "copy_expert"):
+            cursor.cursor.copy_expert(copy_sql, RowStream(rows))
+        else:
+            with cursor.cursor.copy(copy_sql) as copy:
+                for row in rows:
+                    copy.write_row(row)
+
+        cursor.execute(
+            f"INSERT INTO {table} (name, measurement_unit) "
+            "SELECT DISTINCT name, measurement_unit FROM ingredient_staging "
+            "ON CONFLICT (name, measurement_unit) DO NOTHING")
+        return cursor.rowcount
+
+    def bulk_create_rows(self, rows, batch_size):
+        count_before = Ingredient.objects.count()
+        for batch in itertools.batched(rows, batch_size):
+            Ingredient.objects.bulk_create(
+                [Ingredient(name=name, measurement_unit=measurement_unit)
+                 for name, measurement_unit in batch],
+                ignore_conflicts=True,
+            )
+        return Ingredient.objects.count() - count_before
+
+    def handle(self, *args, **options):
+        rows = self.read_rows(options["paths"])
+
+        with transaction.atomic():
+            if connection.vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    created = self.copy_rows(cursor, rows)
+            else:
+                created = self.bulk_create_rows(rows, options["batch_size"])
+
+        invalidate_ingredient_catalog()
+        self.stdout.write(self.style.SUCCESS(
+            f"Loaded {created} new ingredients."))
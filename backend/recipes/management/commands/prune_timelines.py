@@ -0,0 +1,34 @@
+import itertools
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from recipes.models import TimelineEntry
+from recipes.timeline import prune_timelines
+
+
+class Command(BaseCommand):
+    help = ("Trim every feed timeline to the FEED_MAX_ENTRIES most recent "
+            "recipes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+
+    def handle(self, *args, **options):
+        user_ids = (
+            TimelineEntry.objects
+            .values("user_id")
+            .annotate(total=Count("id"))
+            .filter(total__gt=settings.FEED_MAX_ENTRIES)
+            .values_list("user_id", flat=True)
+        )
+
+        pruned = 0
+        for batch in itertools.batched(user_ids.iterator(),
+                                       options["batch_size"]):
+            prune_timelines(batch)
+            pruned += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Pruned {pruned} timelines."))
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import ShoppingCartItem
+
+
+class Command(BaseCommand):
+    help = ("Rebuild the per-user shopping cart totals from ShoppingCart "
+            "and RecipeIngredient, or verify them with --verify.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Only report drift between the stored and actual totals.",
+        )
+
+    def handle(self, *args, **options):
+        if not options["verify"]:
+            ShoppingCartItem.objects.rebuild()
+            self.stdout.write(self.style.SUCCESS(
+                f"Rebuilt {ShoppingCartItem.objects.count()} "
+                "shopping cart items."))
+            return
+
+        expected = {
+            (user_id, ingredient_id): total_amount
+            for user_id, ingredient_id, total_amount
+            in ShoppingCartItem.objects.expected_totals().iterator()
+        }
+        stored = {
+            (user_id, ingredient_id): total_amount
+            for user_id, ingredient_id, total_amount
+            in ShoppingCartItem.objects.values_list(
+                "user_id", "ingredient_id", "total_amount").iterator()
+        }
+
+        drifted = sorted(
+            key for key in expected.keys() | stored.keys()
+            if expected.get(key) != stored.get(key)
+        )
+        for user_id, ingredient_id in drifted:
+            self.stdout.write(
+                f"user {user_id}, ingredient {ingredient_id}: stored "
+                f"{stored.get((user_id, ingredient_id))}, expected "
+                f"{expected.get((user_id, ingredient_id))}")
+
+        if drifted:
+            raise CommandError(
+                f"{len(drifted)} shopping cart items drifted, run the "
+                "command without --verify to rebuild them.")
+
+        self.stdout.write(self.style.SUCCESS("Shopping cart totals match."))
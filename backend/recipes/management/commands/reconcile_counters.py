@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from users.models import Subscription, User
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+
+COUNTERS = (
+    (User, "recipes_count", Recipe, "author"),
+    (User, "subscribers_count", Subscription, "subscribed_to"),
+    (Recipe, "favorites_count", Favorite, "recipe"),
+    (Recipe, "in_carts_count", ShoppingCart, "recipe"),
+)
+
+
+def actual_count(related_model, related_field):
+    return Coalesce(Subquery(
+        related_model.objects
+        .filter(**{related_field: OuterRef("pk")})
+        .order_by()
+        .values(related_field)
+        .annotate(total=Count("pk"))
+        .values("total")
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = ("Recount the denormalized recipes_count, subscribers_count, "
+            "favorites_count and in_carts_count columns and fix the ones "
+            "that drifted.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Only report drifted counters without fixing them.",
+        )
+
+    def handle(self, *args, **options):
+        for model, field_name, related_model, related_field in COUNTERS:
+            count = actual_count(related_model, related_field)
+            drifted = (
+                model.objects
+                .annotate(actual=count)
+                .exclude(**{field_name: F("actual")})
+                .values_list("pk", field_name, "actual")
+            )
+
+            drifted_ids = []
+            for pk, stored, actual in drifted:
+                self.stdout.write(f"{model._meta.model_name} {pk}: "
+                                  f"{field_name} is {stored}, actual {actual}")
+                drifted_ids.append(pk)
+
+            if drifted_ids and not options["verify"]:
+                model.objects.filter(pk__in=drifted_ids).update(
+                    **{field_name: count})
+
+            self.stdout.write(self.style.SUCCESS(
+                f"{model._meta.model_name}.{field_name}: "
+                f"{len(drifted_ids)} drifted"))
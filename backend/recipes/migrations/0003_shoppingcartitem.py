@@ -0,0 +1,53 @@
+# Generated by Django 6.0 on 2026-10-18 03:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_shopping_cart_items(apps, schema_editor):
+    RecipeIngredient = apps.get_model("recipes", "RecipeIngredient")
+    ShoppingCartItem = apps.get_model("recipes", "ShoppingCartItem")
+
+    totals = (
+        RecipeIngredient.objects
+        .filter(recipe__in_shopping_cart_of__isnull=False)
+        .values("recipe__in_shopping_cart_of__user", "ingredient")
+        .annotate(total_amount=models.Sum("amount"))
+        .order_by()
+    )
+    ShoppingCartItem.objects.bulk_create(
+        (ShoppingCartItem(
+            user_id=total["recipe__in_shopping_cart_of__user"],
+            ingredient_id=total["ingredient"],
+            total_amount=total["total_amount"],
+        ) for total in totals.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = (
+        ("recipes", "0002_alter_favorite_options_alter_ingredient_options_and_more"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    )
+
+    operations = (
+        migrations.CreateModel(
+            name="ShoppingCartItem",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("total_amount", models.PositiveIntegerField(verbose_name="Общее количество")),
+                ("ingredient", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="shopping_cart_items", to="recipes.ingredient", verbose_name="Ингредиент")),
+                ("user", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="shopping_cart_items", to=settings.AUTH_USER_MODEL, verbose_name="Пользователь")),
+            ],
+            options={
+                "verbose_name": "позиция списка покупок",
+                "verbose_name_plural": "Списки покупок",
+                "unique_together": {("user", "ingredient")},
+            },
+        ),
+        migrations.RunPython(fill_shopping_cart_items,
+                             migrations.RunPython.noop),
+    )
@@ -0,0 +1,60 @@
+# Generated by Django 6.0 on 2026-10-18 04:02
+
+from django.db import migrations, models
+
+
+def _merge_rows(model, owner_field, amount_field, duplicate_id, kept_id):
+    for row in model.objects.filter(ingredient_id=duplicate_id):
+        kept_row = model.objects.filter(
+            ingredient_id=kept_id,
+            **{owner_field: getattr(row, owner_field)},
+        ).first()
+        if kept_row is None:
+            row.ingredient_id = kept_id
+            row.save(update_fields=["ingredient"])
+            continue
+
+        setattr(kept_row, amount_field,
+                getattr(kept_row, amount_field) + getattr(row, amount_field))
+        kept_row.save(update_fields=[amount_field])
+        row.delete()
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model("recipes", "Ingredient")
+    RecipeIngredient = apps.get_model("recipes", "RecipeIngredient")
+    ShoppingCartItem = apps.get_model("recipes", "ShoppingCartItem")
+
+    duplicates = (
+        Ingredient.objects
+        .values("name", "measurement_unit")
+        .annotate(kept_id=models.Min("id"), total=models.Count("id"))
+        .filter(total__gt=1)
+        .order_by()
+    )
+    for duplicate in duplicates:
+        duplicate_ids = (
+            Ingredient.objects
+            .filter(name=duplicate["name"],
+                    measurement_unit=duplicate["measurement_unit"])
+            .exclude(id=duplicate["kept_id"])
+            .values_list("id", flat=True)
+        )
+        for duplicate_id in list(duplicate_ids):
+            _merge_rows(RecipeIngredient, "recipe_id", "amount",
+                        duplicate_id, duplicate["kept_id"])
+            _merge_rows(ShoppingCartItem, "user_id", "total_amount",
+                        duplicate_id, duplicate["kept_id"])
+            Ingredient.objects.filter(id=duplicate_id).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = (
+        ("recipes", "0003_shoppingcartitem"),
+    )
+
+    operations = (
+        migrations.RunPython(merge_duplicate_ingredients,
+                             migrations.RunPython.noop),
+    )
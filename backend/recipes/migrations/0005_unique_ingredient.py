@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-18 04:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = (
+        ("recipes", "0004_merge_duplicate_ingredients"),
+    )
+
+    operations = (
+        migrations.AddConstraint(
+            model_name="ingredient",
+            constraint=models.UniqueConstraint(fields=("name", "measurement_unit"), name="unique_ingredient"),
+        ),
+    )
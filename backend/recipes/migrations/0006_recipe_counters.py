@@ -0,0 +1,48 @@
+# Generated by Django 6.0 on 2026-10-18 04:08
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def _count_of(model, field_name):
+    return Coalesce(models.Subquery(
+        model.objects
+        .filter(**{field_name: models.OuterRef("pk")})
+        .order_by()
+        .values(field_name)
+        .annotate(total=models.Count("pk"))
+        .values("total")
+    ), 0)
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model("users", "User")
+    Recipe = apps.get_model("recipes", "Recipe")
+    Favorite = apps.get_model("recipes", "Favorite")
+    ShoppingCart = apps.get_model("recipes", "ShoppingCart")
+
+    User.objects.update(recipes_count=_count_of(Recipe, "author"))
+    Recipe.objects.update(favorites_count=_count_of(Favorite, "recipe"),
+                          in_carts_count=_count_of(ShoppingCart, "recipe"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = (
+        ("recipes", "0005_unique_ingredient"),
+        ("users", "0003_user_recipes_count"),
+    )
+
+    operations = (
+        migrations.AddField(
+            model_name="recipe",
+            name="favorites_count",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="Кол-во добавлений в избранное"),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="in_carts_count",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="Кол-во добавлений в корзину"),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    )
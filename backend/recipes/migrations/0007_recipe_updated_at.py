@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-18 04:10
+
+from django.db import migrations, models
+
+
+def copy_published_at(apps, schema_editor):
+    Recipe = apps.get_model("recipes", "Recipe")
+    Recipe.objects.update(updated_at=models.F("published_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = (
+        ("recipes", "0006_recipe_counters"),
+    )
+
+    operations = (
+        migrations.AddField(
+            model_name="recipe",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, verbose_name="Дата изменения"),
+        ),
+        migrations.RunPython(copy_published_at, migrations.RunPython.noop),
+    )
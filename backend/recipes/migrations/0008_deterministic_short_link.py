@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 04:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = (
+        ("recipes", "0007_recipe_updated_at"),
+    )
+
+    operations = (
+        migrations.AlterField(
+            model_name="recipe",
+            name="short_link",
+            field=models.SlugField(default=None, editable=False, max_length=8, null=True, unique=True, verbose_name="Короткая ссылка"),
+        ),
+    )
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 04:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = (
+        ("recipes", "0008_deterministic_short_link"),
+    )
+
+    operations = (
+        migrations.AddField(
+            model_name="recipe",
+            name="image_variants",
+            field=models.JSONField(default=dict, editable=False, verbose_name="Варианты изображения"),
+        ),
+    )
@@ -0,0 +1,48 @@
+# Generated by Django 6.0 on 2026-10-18 04:30
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+
+
+def fill_search_vector(apps, schema_editor):
+    Recipe = apps.get_model("recipes", "Recipe")
+    RecipeIngredient = apps.get_model("recipes", "RecipeIngredient")
+
+    ingredient_names = models.Subquery(
+        RecipeIngredient.objects
+        .filter(recipe=models.OuterRef("pk"))
+        .order_by()
+        .values("recipe")
+        .annotate(names=models.StringAgg("ingredient__name",
+                                         models.Value(" ")))
+        .values("names")
+    )
+    Recipe.objects.update(search_vector=(
+        SearchVector("name", weight="A", config="russian")
+        + SearchVector(ingredient_names, weight="B", config="russian")
+        + SearchVector("text", weight="C", config="russian")
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = (
+        ("recipes", "0009_recipe_image_variants"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    )
+
+    operations = (
+        migrations.AddField(
+            model_name="recipe",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name="Поисковый вектор"),
+        ),
+        migrations.RunPython(fill_search_vector, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=django.contrib.postgres.indexes.GinIndex(fields=["search_vector"], name="recipe_search_vector_idx"),
+        ),
+    )
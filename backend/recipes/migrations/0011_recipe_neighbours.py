@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-10-18 04:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = (
+        ("recipes", "0010_recipe_search_vector"),
+    )
+
+    operations = (
+        migrations.AddField(
+            model_name="recipe",
+            name="interactions_changed_at",
+            field=models.DateTimeField(default=None, editable=False, null=True, verbose_name="Дата изменения избранного и корзин"),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="neighbours_computed_at",
+            field=models.DateTimeField(default=None, editable=False, null=True, verbose_name="Дата расчёта похожих рецептов"),
+        ),
+        migrations.CreateModel(
+            name="RecipeNeighbour",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("score", models.FloatField(verbose_name="Сходство")),
+                ("neighbour", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="similar_to", to="recipes.recipe", verbose_name="Похожий рецепт")),
+                ("recipe", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="neighbours", to="recipes.recipe", verbose_name="Рецепт")),
+            ],
+            options={
+                "verbose_name": "похожий рецепт",
+                "verbose_name_plural": "Похожие рецепты",
+                "ordering": ("recipe", "-score"),
+                "indexes": [models.Index(fields=["recipe", "-score"], name="recipe_neighbour_score_idx")],
+                "unique_together": {("recipe", "neighbour")},
+            },
+        ),
+    )
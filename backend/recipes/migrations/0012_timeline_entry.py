@@ -0,0 +1,58 @@
+# Generated by Django 6.0 on 2026-10-18 04:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+TIMELINE_LENGTH = 500
+
+
+def fill_timelines(apps, schema_editor):
+    Recipe = apps.get_model("recipes", "Recipe")
+    TimelineEntry = apps.get_model("recipes", "TimelineEntry")
+    Subscription = apps.get_model("users", "Subscription")
+
+    recent_recipes = {}
+    for subscriber_id, author_id in (
+        Subscription.objects.order_by("subscribed_to")
+        .values_list("subscriber_id", "subscribed_to_id")
+        .iterator()
+    ):
+        if author_id not in recent_recipes:
+            recent_recipes = {author_id: list(
+                Recipe.objects.filter(author_id=author_id)
+                .order_by("-published_at")
+                .values_list("id", "published_at")[:TIMELINE_LENGTH])}
+
+        TimelineEntry.objects.bulk_create([
+            TimelineEntry(user_id=subscriber_id, recipe_id=recipe_id,
+                          published_at=published_at)
+            for recipe_id, published_at in recent_recipes[author_id]
+        ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = (
+        ("recipes", "0011_recipe_neighbours"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    )
+
+    operations = (
+        migrations.CreateModel(
+            name="TimelineEntry",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("published_at", models.DateTimeField(verbose_name="Дата публикации")),
+                ("recipe", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="timeline_entries", to="recipes.recipe", verbose_name="Рецепт")),
+                ("user", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="timeline", to=settings.AUTH_USER_MODEL, verbose_name="Пользователь")),
+            ],
+            options={
+                "verbose_name": "запись ленты",
+                "verbose_name_plural": "Ленты подписок",
+                "indexes": [models.Index(fields=["user", "-published_at"], name="timeline_user_published_idx")],
+                "unique_together": {("user", "recipe")},
+            },
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    )
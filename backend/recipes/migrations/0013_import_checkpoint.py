@@ -0,0 +1,25 @@
+# Generated by Django 6.0 on 2026-10-18 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = (
+        ("recipes", "0012_timeline_entry"),
+    )
+
+    operations = (
+        migrations.CreateModel(
+            name="ImportCheckpoint",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("source", models.CharField(max_length=255, unique=True, verbose_name="Источник")),
+                ("line", models.PositiveIntegerField(verbose_name="Последняя строка")),
+            ],
+            options={
+                "verbose_name": "контрольная точка импорта",
+                "verbose_name_plural": "Контрольные точки импорта",
+            },
+        ),
+    )
@@ -1,15 +1,28 @@
 import random
 
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    SearchVectorField,
+)
 from django.core import validators
-from django.db import models
-from foodgram_backend.constants import (INGREDIENT_MEASUREMENT_UNIT_MAX_LENGTH,
-                                        INGREDIENT_NAME_MAX_LENGTH,
-                                        RECIPE_IMAGE_UPLOAD_PATH,
-                                        RECIPE_NAME_MAX_LENGTH,
-                                        SHORT_LINK_ALLOWED_CHARS,
-                                        SHORT_LINK_LENGTH)
+from django.db import models, transaction
+from django.db.models.functions import Greatest
+from foodgram_backend.constants import (
+    INGREDIENT_MEASUREMENT_UNIT_MAX_LENGTH,
+    INGREDIENT_NAME_MAX_LENGTH,
+    RECIPE_IMAGE_UPLOAD_PATH,
+    RECIPE_NAME_MAX_LENGTH,
+    RECIPE_SEARCH_CONFIG,
+    SHORT_LINK_ALLOWED_CHARS,
+    SHORT_LINK_LENGTH,
+)
 from users.models import User
 
+from .short_links import encode_short_link
+
 
 class Ingredient(models.Model):
     name = models.CharField(
@@ -26,16 +39,73 @@ class Ingredient(models.Model):
         verbose_name_plural = "Ингредиенты"
 
         ordering = ("name", )
+        constraints = (
+            models.UniqueConstraint(fields=("name", "measurement_unit"),
+                                    name="unique_ingredient"),
+        )
 
     def __str__(self):
         return f"{self.name} ({self.measurement_unit})"
 
 
+def update_counter(obj, field_name, delta):
+    """Atomically shift a denormalized counter column of `obj`."""
+    update_counters(type(obj), [obj.pk], field_name, delta)
+
+
+def update_counters(model, pks, field_name, delta, **values):
+    """Shift the same counter column of several rows in one UPDATE.
+
+    `values` are other columns to set in the same statement.
+    """
+    model.objects.filter(pk__in=pks).update(**{
+        field_name: Greatest(models.F(field_name) + delta, 0),
+        **values,
+    })
+
+
 def create_slug():
+    # Legacy random slugs, kept for the migrations that reference them.
     return "".join(
         random.choices(SHORT_LINK_ALLOWED_CHARS, k=SHORT_LINK_LENGTH))
 
 
+class RecipeQuerySet(models.QuerySet):
+
+    def update_search_vector(self):
+        """Rebuild the stored full-text vector of the selected recipes.
+
+        Matches in the name rank highest, then ingredient names, then the
+        description.
+        """
+        ingredient_names = models.Subquery(
+            RecipeIngredient.objects
+            .filter(recipe=models.OuterRef("pk"))
+            .order_by()
+            .values("recipe")
+            .annotate(names=models.StringAgg("ingredient__name",
+                                             models.Value(" ")))
+            .values("names")
+        )
+        return self.update(search_vector=(
+            SearchVector("name", weight="A", config=RECIPE_SEARCH_CONFIG)
+            + SearchVector(ingredient_names, weight="B",
+                           config=RECIPE_SEARCH_CONFIG)
+            + SearchVector("text", weight="C", config=RECIPE_SEARCH_CONFIG)
+        ))
+
+    def search(self, text):
+        """Filter by a web-style search query, best matches first."""
+        query = SearchQuery(text, config=RECIPE_SEARCH_CONFIG,
+                            search_type="websearch")
+        return (
+            self.filter(search_vector=query)
+            .annotate(search_rank=SearchRank(models.F("search_vector"),
+                                             query))
+            .order_by("-search_rank", "-published_at", "-id")
+        )
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User,
@@ -52,6 +122,11 @@ class Recipe(models.Model):
         upload_to=RECIPE_IMAGE_UPLOAD_PATH,
         default=None,
     )
+    image_variants = models.JSONField(
+        verbose_name="Варианты изображения",
+        default=dict,
+        editable=False,
+    )
     text = models.TextField(verbose_name="Описание")
 
     cooking_time = models.PositiveSmallIntegerField(
@@ -60,22 +135,105 @@ class Recipe(models.Model):
 
     published_at = models.DateTimeField(verbose_name="Дата публикации",
                                         auto_now_add=True)
+    updated_at = models.DateTimeField(verbose_name="Дата изменения",
+                                      auto_now=True)
 
     short_link = models.SlugField(verbose_name="Короткая ссылка",
                                   max_length=SHORT_LINK_LENGTH,
                                   unique=True,
-                                  default=create_slug,
+                                  null=True,
+                                  default=None,
                                   editable=False)
 
+    favorites_count = models.PositiveIntegerField(
+        verbose_name="Кол-во добавлений в избранное",
+        default=0,
+        editable=False,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name="Кол-во добавлений в корзину",
+        default=0,
+        editable=False,
+    )
+    interactions_changed_at = models.DateTimeField(
+        verbose_name="Дата изменения избранного и корзин",
+        null=True,
+        default=None,
+        editable=False,
+    )
+    neighbours_computed_at = models.DateTimeField(
+        verbose_name="Дата расчёта похожих рецептов",
+        null=True,
+        default=None,
+        editable=False,
+    )
+
+    search_vector = SearchVectorField(verbose_name="Поисковый вектор",
+                                      null=True,
+                                      editable=False)
+
+    objects = RecipeQuerySet.as_manager()
+
     class Meta:
         verbose_name = "рецепт"
         verbose_name_plural = "Рецепты"
 
         ordering = ("-published_at", )
+        indexes = (
+            GinIndex(fields=("search_vector", ),
+                     name="recipe_search_vector_idx"),
+        )
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        if self.short_link is None:
+            self.short_link = encode_short_link(self.pk)
+            Recipe.objects.filter(pk=self.pk).update(
+                short_link=self.short_link)
+
+    def ingredient_amounts(self):
+        return dict(self.recipe_ingredients.values_list("ingredient_id",
+                                                        "amount"))
+
+    def set_ingredient_amounts(self, amounts):
+        """Bring the ingredient rows in line with `amounts`.
+
+        Only the difference is written: one bulk update for the changed
+        amounts, one insert for the new ingredients and one delete for the
+        dropped ones. Returns the previous amounts.
+        """
+        rows = {row.ingredient_id: row for row in
+                RecipeIngredient.objects.filter(recipe=self)}
+        old_amounts = {ingredient_id: row.amount
+                       for ingredient_id, row in rows.items()}
+
+        changed = []
+        for ingredient_id, row in rows.items():
+            amount = amounts.get(ingredient_id, row.amount)
+            if amount != row.amount:
+                row.amount = amount
+                changed.append(row)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ["amount"])
+
+        added = amounts.keys() - rows.keys()
+        if added:
+            RecipeIngredient.objects.bulk_create([
+                RecipeIngredient(recipe=self, ingredient_id=ingredient_id,
+                                 amount=amounts[ingredient_id])
+                for ingredient_id in added
+            ])
+
+        removed = rows.keys() - amounts.keys()
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=self, ingredient_id__in=removed).delete()
+
+        return old_amounts
+
 
 class RecipeIngredient(models.Model):
     recipe = models.ForeignKey(Recipe,
@@ -140,3 +298,190 @@ class ShoppingCart(models.Model):
     def __str__(self):
         return (f"{self.recipe} is in shopping cart of "
                 f"{self.user.username}")
+
+
+class ShoppingCartItemQuerySet(models.QuerySet):
+
+    def expected_totals(self):
+        """Aggregate the cart totals from scratch, without using this table."""
+        return (
+            RecipeIngredient.objects
+            .filter(recipe__in_shopping_cart_of__isnull=False)
+            .values("recipe__in_shopping_cart_of__user", "ingredient")
+            .annotate(total_amount=models.Sum("amount"))
+            .values_list("recipe__in_shopping_cart_of__user", "ingredient",
+                         "total_amount")
+            .order_by()
+        )
+
+    def rebuild(self):
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create(
+                (ShoppingCartItem(user_id=user_id,
+                                  ingredient_id=ingredient_id,
+                                  total_amount=total_amount)
+                 for user_id, ingredient_id, total_amount
+                 in self.expected_totals().iterator()),
+                batch_size=1000,
+            )
+
+    def apply_amounts(self, user_ids, amounts):
+        """Add signed ingredient amounts to the carts of the given users.
+
+        `amounts` maps ingredient ids to the delta of their total amount.
+        Items that drop to zero or below are removed.
+        """
+        amounts = {id: delta for id, delta in amounts.items() if delta}
+        user_ids = list(user_ids)
+        if not amounts or not user_ids:
+            return
+
+        items = self.filter(user_id__in=user_ids, ingredient_id__in=amounts)
+        self.bulk_create(
+            [ShoppingCartItem(user_id=user_id,
+                              ingredient_id=ingredient_id,
+                              total_amount=0)
+             for user_id in user_ids
+             for ingredient_id, delta in amounts.items() if delta > 0],
+            ignore_conflicts=True,
+        )
+        # Clamped, as totals that drifted from the recipes could otherwise
+        # go negative, which the unsigned column rejects.
+        items.update(total_amount=Greatest(
+            models.F("total_amount") + models.Case(
+                *(models.When(ingredient_id=ingredient_id, then=delta)
+                  for ingredient_id, delta in amounts.items()),
+                default=0,
+            ),
+            0,
+        ))
+        items.filter(total_amount=0).delete()
+
+    def add_recipe(self, user, recipe):
+        self.apply_amounts([user.pk], recipe.ingredient_amounts())
+
+    def remove_recipe(self, user, recipe):
+        self.apply_amounts([user.pk], {
+            ingredient_id: -amount
+            for ingredient_id, amount in recipe.ingredient_amounts().items()
+        })
+
+    def _summed_amounts(self, recipe_ids):
+        return dict(
+            RecipeIngredient.objects
+            .filter(recipe_id__in=recipe_ids)
+            .values("ingredient_id")
+            .annotate(total=models.Sum("amount"))
+            .values_list("ingredient_id", "total")
+            .order_by()
+        )
+
+    def add_recipes(self, user, recipe_ids):
+        self.apply_amounts([user.pk], self._summed_amounts(recipe_ids))
+
+    def remove_recipes(self, user, recipe_ids):
+        self.apply_amounts([user.pk], {
+            ingredient_id: -amount for ingredient_id, amount
+            in self._summed_amounts(recipe_ids).items()
+        })
+
+    def change_recipe(self, recipe, old_amounts, new_amounts):
+        """Move every cart holding the recipe from old to new amounts."""
+        self.apply_amounts(
+            recipe.in_shopping_cart_of.values_list("user_id", flat=True),
+            {
+                ingredient_id: (new_amounts.get(ingredient_id, 0)
+                                - old_amounts.get(ingredient_id, 0))
+                for ingredient_id in old_amounts.keys() | new_amounts.keys()
+            },
+        )
+
+
+class ShoppingCartItem(models.Model):
+    user = models.ForeignKey(User,
+                             verbose_name="Пользователь",
+                             on_delete=models.CASCADE,
+                             related_name="shopping_cart_items")
+    ingredient = models.ForeignKey(Ingredient,
+                                   verbose_name="Ингредиент",
+                                   on_delete=models.CASCADE,
+                                   related_name="shopping_cart_items")
+    total_amount = models.PositiveIntegerField(verbose_name="Общее количество")
+
+    objects = ShoppingCartItemQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "позиция списка покупок"
+        verbose_name_plural = "Списки покупок"
+
+        unique_together = ("user", "ingredient")
+
+    def __str__(self):
+        return (f"{self.user.username}: {self.ingredient.name} "
+                f"{self.total_amount} {self.ingredient.measurement_unit}")
+
+
+class RecipeNeighbour(models.Model):
+    recipe = models.ForeignKey(Recipe,
+                               verbose_name="Рецепт",
+                               on_delete=models.CASCADE,
+                               related_name="neighbours")
+    neighbour = models.ForeignKey(Recipe,
+                                  verbose_name="Похожий рецепт",
+                                  on_delete=models.CASCADE,
+                                  related_name="similar_to")
+    score = models.FloatField(verbose_name="Сходство")
+
+    class Meta:
+        verbose_name = "похожий рецепт"
+        verbose_name_plural = "Похожие рецепты"
+
+        ordering = ("recipe", "-score")
+        unique_together = ("recipe", "neighbour")
+        indexes = (
+            models.Index(fields=("recipe", "-score"),
+                         name="recipe_neighbour_score_idx"),
+        )
+
+    def __str__(self):
+        return f"{self.recipe} ~ {self.neighbour}: {self.score:.3f}"
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(User,
+                             verbose_name="Пользователь",
+                             on_delete=models.CASCADE,
+                             related_name="timeline")
+    recipe = models.ForeignKey(Recipe,
+                               verbose_name="Рецепт",
+                               on_delete=models.CASCADE,
+                               related_name="timeline_entries")
+    published_at = models.DateTimeField(verbose_name="Дата публикации")
+
+    class Meta:
+        verbose_name = "запись ленты"
+        verbose_name_plural = "Ленты подписок"
+
+        unique_together = ("user", "recipe")
+        indexes = (
+            models.Index(fields=("user", "-published_at"),
+                         name="timeline_user_published_idx"),
+        )
+
+    def __str__(self):
+        return f"{self.user.username}: {self.recipe}"
+
+
+class ImportCheckpoint(models.Model):
+    source = models.CharField(verbose_name="Источник",
+                              max_length=255,
+                              unique=True)
+    line = models.PositiveIntegerField(verbose_name="Последняя строка")
+
+    class Meta:
+        verbose_name = "контрольная точка импорта"
+        verbose_name_plural = "Контрольные точки импорта"
+
+    def __str__(self):
+        return f"{self.source}: {self.line}"
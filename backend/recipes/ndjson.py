@@ -0,0 +1,217 @@
+import base64
+import itertools
+import json
+import uuid
+from collections import Counter, defaultdict
+from functools import partial
+from pathlib import PurePosixPath
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.utils.dateparse import parse_datetime
+from foodgram_backend.constants import (
+    RECIPE_EXPORT_CHUNK_SIZE,
+    RECIPE_IMAGE_UPLOAD_PATH,
+    RECIPE_LIST_VERSION,
+    USER_PROFILE_VERSION,
+)
+from foodgram_backend.versions import bump_version
+from users.models import User
+
+from .catalog import invalidate_ingredient_catalog
+from .inverted_index import recipe_ingredients_changed
+from .models import (
+    ImportCheckpoint,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    update_counter,
+)
+from .short_links import encode_short_link
+
+RECIPE_EXPORT_FIELDS = ("id", "author__email", "author__username", "name",
+                        "image", "text", "cooking_time", "published_at",
+                        "updated_at")
+
+
+def _ingredient_rows(recipe_ids):
+    rows = defaultdict(list)
+    for recipe_id, name, unit, amount in (
+        RecipeIngredient.objects
+        .filter(recipe_id__in=recipe_ids)
+        .order_by("recipe_id", "id")
+        .values_list("recipe_id", "ingredient__name",
+                     "ingredient__measurement_unit", "amount")
+    ):
+        rows[recipe_id].append({"name": name, "measurement_unit": unit,
+                                "amount": amount})
+    return rows
+
+
+def _image_data(name):
+    with default_storage.open(name, "rb") as file:
+        return base64.b64encode(file.read()).decode()
+
+
+def export_recipes(queryset=None, inline_images=False):
+    """Yield the recipes as NDJSON lines, one encoded recipe per line.
+
+    Recipes are read through a server-side cursor in chunks, and the
+    ingredients of every chunk are loaded with one query, so memory use
+    does not grow with the catalog. Authors and ingredients are referenced
+    by their natural keys.
+    """
+    if queryset is None:
+        queryset = Recipe.objects.all()
+    recipes = (queryset.order_by("id").values(*RECIPE_EXPORT_FIELDS)
+               .iterator(chunk_size=RECIPE_EXPORT_CHUNK_SIZE))
+
+    for chunk in itertools.batched(recipes, RECIPE_EXPORT_CHUNK_SIZE):
+        ingredients = _ingredient_rows([recipe["id"] for recipe in chunk])
+        for recipe in chunk:
+            line = {
+                "id": recipe["id"],
+                "author": {"email": recipe["author__email"],
+                           "username": recipe["author__username"]},
+                "name": recipe["name"],
+                "text": recipe["text"],
+                "cooking_time": recipe["cooking_time"],
+                "published_at": recipe["published_at"].isoformat(),
+                "updated_at": recipe["updated_at"].isoformat(),
+                "image": recipe["image"],
+                "ingredients": ingredients[recipe["id"]],
+            }
+            if inline_images and recipe["image"]:
+                line["image_data"] = _image_data(recipe["image"])
+            yield json.dumps(line, ensure_ascii=False).encode() + b"\n"
+
+
+class RecipeImporter:
+    """Creates recipes from decoded NDJSON lines, one batch at a time.
+
+    Authors are matched by email; recipes of unknown authors are skipped.
+    Unknown ingredients are added to the catalog. With a `checkpoint`
+    name, every batch records its last line in an ImportCheckpoint row in
+    the same transaction, so a rerun never imports a committed batch
+    twice.
+    """
+
+    def __init__(self, checkpoint=None):
+        self.checkpoint = checkpoint
+        self.ingredient_ids = {
+            (name, unit): id for id, name, unit in
+            Ingredient.objects.values_list("id", "name", "measurement_unit")
+        }
+        self.skipped = 0
+
+    def _ensure_ingredients(self, lines):
+        missing = {
+            (ingredient["name"], ingredient["measurement_unit"])
+            for line in lines for ingredient in line["ingredients"]
+        } - self.ingredient_ids.keys()
+        if not missing:
+            return
+
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=name, measurement_unit=unit)
+             for name, unit in missing],
+            ignore_conflicts=True,
+        )
+        names = {name for name, _ in missing}
+        self.ingredient_ids.update(
+            ((name, unit), id) for id, name, unit in
+            Ingredient.objects.filter(name__in=names)
+            .values_list("id", "name", "measurement_unit"))
+        transaction.on_commit(invalidate_ingredient_catalog)
+
+    def _image_name(self, line):
+        if "image_data" not in line:
+            return line["image"]
+
+        name = PurePosixPath(line["image"] or "image.png").name
+        return default_storage.save(
+            f"{RECIPE_IMAGE_UPLOAD_PATH}{uuid.uuid4().hex}_{name}",
+            ContentFile(base64.b64decode(line["image_data"])))
+
+    def _build_recipe(self, line, author):
+        return Recipe(
+            author=author,
+            name=line["name"],
+            text=line["text"],
+            cooking_time=line["cooking_time"],
+            image=self._image_name(line),
+        )
+
+    def _restore_generated_fields(self, recipes, lines):
+        """Write the short links and the exported dates of new recipes.
+
+        bulk_create bypasses Recipe.save() and overwrites the auto dates.
+        A plain executemany is used because bulk_update's CASE expressions
+        cost more than the inserts themselves.
+        """
+        fields = [Recipe._meta.get_field(name) for name in
+                  ("short_link", "published_at", "updated_at")]
+        connection = connections[Recipe.objects.db]
+        rows = []
+        for recipe, line in zip(recipes, lines):
+            values = (encode_short_link(recipe.pk),
+                      parse_datetime(line["published_at"]),
+                      parse_datetime(line["updated_at"]))
+            rows.append([
+                *(field.get_db_prep_save(value, connection)
+                  for field, value in zip(fields, values)),
+                recipe.pk,
+            ])
+
+        quote = connection.ops.quote_name
+        assignments = ", ".join(f"{quote(field.column)} = %s"
+                                for field in fields)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"UPDATE {quote(Recipe._meta.db_table)} SET {assignments} "
+                f"WHERE {quote(Recipe._meta.pk.column)} = %s", rows)
+
+    def import_batch(self, lines, last_line=None):
+        """Create the recipes of one batch in a single transaction."""
+        with transaction.atomic():
+            if self.checkpoint is not None:
+                ImportCheckpoint.objects.update_or_create(
+                    source=self.checkpoint, defaults={"line": last_line})
+            authors = User.objects.in_bulk(
+                {line["author"]["email"] for line in lines},
+                field_name="email")
+            known = [line for line in lines
+                     if line["author"]["email"] in authors]
+            self.skipped += len(lines) - len(known)
+            lines = known
+            self._ensure_ingredients(lines)
+
+            recipes = Recipe.objects.bulk_create([
+                self._build_recipe(line, authors[line["author"]["email"]])
+                for line in lines
+            ])
+            self._restore_generated_fields(recipes, lines)
+
+            RecipeIngredient.objects.bulk_create([
+                RecipeIngredient(
+                    recipe=recipe,
+                    ingredient_id=self.ingredient_ids[
+                        (ingredient["name"], ingredient["measurement_unit"])],
+                    amount=ingredient["amount"],
+                )
+                for recipe, line in zip(recipes, lines)
+                for ingredient in line["ingredients"]
+            ])
+            recipe_ids = [recipe.pk for recipe in recipes]
+            Recipe.objects.filter(pk__in=recipe_ids).update_search_vector()
+            transaction.on_commit(
+                partial(recipe_ingredients_changed, recipe_ids))
+
+            for author, count in Counter(
+                    recipe.author for recipe in recipes).items():
+                update_counter(author, "recipes_count", count)
+
+            transaction.on_commit(partial(bump_version, RECIPE_LIST_VERSION))
+            transaction.on_commit(partial(bump_version, USER_PROFILE_VERSION))
+        return len(recipes)
@@ -0,0 +1,134 @@
+import itertools
+import math
+
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Favorite, Recipe, RecipeNeighbour, ShoppingCart
+
+INTERACTION_MODELS = (Favorite, ShoppingCart)
+
+
+def _interactions_sql(connection):
+    """A query of the distinct (user, recipe) interaction pairs.
+
+    A favorite and a shopping cart entry both count as one interaction,
+    so the matrix is binary.
+    """
+    quote = connection.ops.quote_name
+    return " UNION ".join(
+        f"SELECT {quote(model._meta.get_field('user').column)} AS user_id, "
+        f"{quote(model._meta.get_field('recipe').column)} AS recipe_id "
+        f"FROM {quote(model._meta.db_table)}"
+        for model in INTERACTION_MODELS
+    )
+
+
+def nearest_neighbours(recipe_ids, top_k):
+    """Top-K recipes by cosine similarity of their interaction columns.
+
+    With binary interactions the cosine of two recipes is the number of
+    shared users over the geometric mean of their user counts. The
+    database counts the shared users of only the given recipes and ranks
+    them by the squared cosine, which orders the same way, so just top_k
+    rows per recipe come back. Returns (recipe_id, score, neighbour_id)
+    rows.
+    """
+    connection = connections[RecipeNeighbour.objects.db]
+    placeholders = ", ".join(["%s"] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"WITH interactions AS ({_interactions_sql(connection)}), "
+            "totals AS ("
+            "  SELECT recipe_id, COUNT(*) AS users FROM interactions"
+            "  GROUP BY recipe_id), "
+            "common AS ("
+            "  SELECT own.recipe_id, other.recipe_id AS neighbour_id,"
+            "    COUNT(*) AS shared"
+            "  FROM interactions own JOIN interactions other"
+            "    ON other.user_id = own.user_id"
+            "    AND other.recipe_id <> own.recipe_id"
+            f"  WHERE own.recipe_id IN ({placeholders})"
+            "  GROUP BY own.recipe_id, other.recipe_id), "
+            "ranked AS ("
+            "  SELECT common.recipe_id, common.neighbour_id, common.shared,"
+            "    own_totals.users, other_totals.users AS neighbour_users,"
+            "    ROW_NUMBER() OVER ("
+            "      PARTITION BY common.recipe_id"
+            "      ORDER BY 1.0 * common.shared * common.shared"
+            "        / other_totals.users DESC,"
+            "        common.neighbour_id DESC) AS position"
+            "  FROM common"
+            "  JOIN totals own_totals"
+            "    ON own_totals.recipe_id = common.recipe_id"
+            "  JOIN totals other_totals"
+            "    ON other_totals.recipe_id = common.neighbour_id) "
+            "SELECT recipe_id, neighbour_id, shared, users, neighbour_users "
+            "FROM ranked WHERE position <= %s",
+            [*recipe_ids, top_k])
+        for recipe_id, neighbour_id, shared, users, neighbour_users in cursor:
+            yield (recipe_id, shared / math.sqrt(users * neighbour_users),
+                   neighbour_id)
+
+
+def stale_recipe_ids():
+    """Recipes whose neighbours may have changed since their computation.
+
+    Changed interactions of a recipe move its similarity to every recipe
+    sharing a user with it now, and to the recipes listing it as a
+    neighbour from before, so those are recomputed too.
+    """
+    changed = (
+        Recipe.objects
+        .filter(Q(neighbours_computed_at__isnull=True)
+                | Q(interactions_changed_at__gt=F("neighbours_computed_at")))
+        .values("id")
+    )
+    users = Q()
+    for model in INTERACTION_MODELS:
+        users |= Q(user__in=model.objects.filter(
+            recipe__in=changed).values("user"))
+    related = Q(pk__in=changed) | Q(pk__in=RecipeNeighbour.objects.filter(
+        neighbour__in=changed).values("recipe"))
+    for model in INTERACTION_MODELS:
+        related |= Q(pk__in=model.objects.filter(users).values("recipe"))
+    return Recipe.objects.filter(related).values_list("id", flat=True)
+
+
+def build_neighbours(recipe_ids, top_k, chunk_size):
+    """Recompute and store the neighbours of the given recipes.
+
+    Similarities are computed and written chunk by chunk, so only one
+    chunk of neighbour lists is held at a time. Recipes are stamped with
+    the start time, so interactions that change during the run are
+    picked up by the next incremental run.
+    """
+    started_at = timezone.now()
+
+    computed = 0
+    for chunk in itertools.batched(recipe_ids, chunk_size):
+        neighbours = [
+            RecipeNeighbour(recipe_id=recipe_id, neighbour_id=neighbour_id,
+                            score=score)
+            for recipe_id, score, neighbour_id in nearest_neighbours(
+                chunk, top_k)
+        ]
+        with transaction.atomic():
+            # Skip the recipes deleted since the similarities were read.
+            existing_ids = set(Recipe.objects.filter(pk__in={
+                *chunk,
+                *(neighbour.neighbour_id for neighbour in neighbours),
+            }).values_list("id", flat=True))
+            neighbours = [
+                neighbour for neighbour in neighbours
+                if {neighbour.recipe_id, neighbour.neighbour_id}
+                <= existing_ids
+            ]
+
+            RecipeNeighbour.objects.filter(recipe_id__in=chunk).delete()
+            RecipeNeighbour.objects.bulk_create(neighbours)
+            Recipe.objects.filter(pk__in=chunk).update(
+                neighbours_computed_at=started_at)
+        computed += len(chunk)
+    return computed
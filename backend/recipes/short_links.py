@@ -0,0 +1,88 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from foodgram_backend.constants import (
+    RECIPE_DELETION_VERSION,
+    SHORT_LINK_ALLOWED_CHARS,
+    SHORT_LINK_ENCODED_LENGTH,
+)
+from foodgram_backend.versions import get_version
+
+BASE = len(SHORT_LINK_ALLOWED_CHARS)
+ALLOWED_CHARS = frozenset(SHORT_LINK_ALLOWED_CHARS)
+MODULUS = BASE ** SHORT_LINK_ENCODED_LENGTH
+# Any multiplier coprime with the modulus makes the mapping a permutation.
+MULTIPLIER = 2654435761
+OFFSET = 1013904223
+INVERSE_MULTIPLIER = pow(MULTIPLIER, -1, MODULUS)
+
+
+def encode_short_link(recipe_id):
+    """Map a recipe id to a unique, non-sequential base62 slug.
+
+    Encoded slugs are one character shorter than the legacy random ones,
+    so the two schemes never collide.
+    """
+    value = (recipe_id * MULTIPLIER + OFFSET) % MODULUS
+    chars = []
+    for _ in range(SHORT_LINK_ENCODED_LENGTH):
+        value, remainder = divmod(value, BASE)
+        chars.append(SHORT_LINK_ALLOWED_CHARS[remainder])
+    return "".join(reversed(chars))
+
+
+def decode_short_link(slug):
+    """Return the recipe id an encoded slug maps to, or None."""
+    if (len(slug) != SHORT_LINK_ENCODED_LENGTH
+            or not set(slug) <= ALLOWED_CHARS):
+        return None
+
+    value = 0
+    for char in slug:
+        value = value * BASE + SHORT_LINK_ALLOWED_CHARS.index(char)
+    return (value - OFFSET) * INVERSE_MULTIPLIER % MODULUS
+
+
+class ShortLinkCache:
+    """Bounded, process-local LRU cache of short link -> recipe id.
+
+    Entries of deleted recipes are dropped locally right away, and the
+    whole cache is cleared when another process bumps the deletion stamp,
+    which is checked at most every VERSION_STAMP_MAX_AGE seconds.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._version = None
+
+    def _check_version(self):
+        version = get_version(RECIPE_DELETION_VERSION,
+                              max_age=settings.VERSION_STAMP_MAX_AGE)
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+
+    def get(self, slug):
+        with self._lock:
+            self._check_version()
+            recipe_id = self._entries.get(slug)
+            if recipe_id is not None:
+                self._entries.move_to_end(slug)
+            return recipe_id
+
+    def set(self, slug, recipe_id):
+        with self._lock:
+            self._entries[slug] = recipe_id
+            self._entries.move_to_end(slug)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, slug):
+        with self._lock:
+            self._entries.pop(slug, None)
+
+
+short_link_cache = ShortLinkCache(settings.SHORT_LINK_CACHE_SIZE)
@@ -0,0 +1,65 @@
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from foodgram_backend.constants import (
+    RECIPE_DELETION_VERSION,
+    RECIPE_LIST_VERSION,
+)
+from foodgram_backend.image_variants import schedule_variants
+from foodgram_backend.versions import bump_version
+
+from .catalog import invalidate_ingredient_catalog
+from .inverted_index import (
+    invalidate_recipe_ingredient_index,
+    recipe_ingredients_changed,
+)
+from .models import Favorite, Ingredient, Recipe, ShoppingCart
+from .short_links import short_link_cache
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def ingredient_changed(**kwargs):
+    transaction.on_commit(invalidate_ingredient_catalog)
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(instance, created, **kwargs):
+    if not created:
+        Recipe.objects.filter(
+            recipe_ingredients__ingredient=instance).update_search_vector()
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(instance, **kwargs):
+    schedule_variants(instance, "image", settings.RECIPE_IMAGE_VARIANTS)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(instance, **kwargs):
+    short_link_cache.discard(instance.short_link)
+    transaction.on_commit(partial(bump_version, RECIPE_DELETION_VERSION))
+    transaction.on_commit(
+        partial(recipe_ingredients_changed, [instance.pk]))
+
+
+@receiver(post_delete, sender=Ingredient)
+def ingredient_deleted(**kwargs):
+    transaction.on_commit(invalidate_recipe_ingredient_index)
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+@receiver([post_save, post_delete], sender=Favorite)
+@receiver([post_save, post_delete], sender=ShoppingCart)
+def recipe_list_changed(**kwargs):
+    transaction.on_commit(partial(bump_version, RECIPE_LIST_VERSION))
+
+
+@receiver([post_save, post_delete], sender=Favorite)
+@receiver([post_save, post_delete], sender=ShoppingCart)
+def recipe_interactions_changed(instance, **kwargs):
+    Recipe.objects.filter(pk=instance.recipe_id).update(
+        interactions_changed_at=timezone.now())
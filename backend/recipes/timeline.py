@@ -0,0 +1,199 @@
+import itertools
+import logging
+from functools import partial
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models.functions import RowNumber
+from foodgram_backend.workers import WorkerPool
+from users.models import Subscription, User
+
+from .models import Recipe, TimelineEntry
+
+logger = logging.getLogger(__name__)
+
+FAN_OUT_BATCH_SIZE = 1000
+
+fan_out_pool = WorkerPool("feed-fan-out", settings.FEED_FANOUT_WORKERS,
+                          settings.FEED_FANOUT_QUEUE_SIZE)
+
+
+def _submit_fan_out(job):
+    # A dropped fan-out would leave holes in the feeds, so when the queue
+    # is full the job runs in place instead.
+    if not fan_out_pool.submit(job):
+        logger.warning("Feed fan-out queue is full, job run inline")
+        job()
+
+
+def prune_timelines(user_ids):
+    """Keep only the FEED_MAX_ENTRIES most recent entries of each user."""
+    overflow = (
+        TimelineEntry.objects
+        .filter(user_id__in=user_ids)
+        .annotate(position=models.Window(
+            RowNumber(),
+            partition_by=models.F("user_id"),
+            order_by=(models.F("published_at").desc(),
+                      models.F("recipe_id").desc()),
+        ))
+        .filter(position__gt=settings.FEED_MAX_ENTRIES)
+        .values_list("id", flat=True)
+    )
+    TimelineEntry.objects.filter(pk__in=list(overflow)).delete()
+
+
+def _fan_out(author_id, recipes):
+    """Add (recipe_id, published_at) pairs to the author's subscribers.
+
+    Entries are written in batches, and the touched timelines are trimmed
+    to FEED_MAX_ENTRIES once every batch is in.
+    """
+    if not recipes:
+        return
+
+    subscriber_ids = (
+        Subscription.objects
+        .filter(subscribed_to_id=author_id)
+        .values_list("subscriber_id", flat=True)
+        .iterator(chunk_size=FAN_OUT_BATCH_SIZE)
+    )
+    batch_size = max(FAN_OUT_BATCH_SIZE // len(recipes), 1)
+    touched_ids = []
+    for batch in itertools.batched(subscriber_ids, batch_size):
+        TimelineEntry.objects.bulk_create([
+            TimelineEntry(user_id=user_id, recipe_id=recipe_id,
+                          published_at=published_at)
+            for user_id in batch
+            for recipe_id, published_at in recipes
+        ], ignore_conflicts=True)
+        touched_ids.extend(batch)
+    prune_timelines(touched_ids)
+
+
+def _recent_recipes(author_ids):
+    return list(
+        Recipe.objects
+        .filter(author_id__in=author_ids)
+        .order_by("-published_at")
+        .values_list("id", "published_at")[:settings.FEED_MAX_ENTRIES]
+    )
+
+
+def _fan_out_new_recipe(author_id, recipe_id, published_at):
+    if User.objects.filter(pk=author_id, pulls_feed=True).exists():
+        return
+
+    _fan_out(author_id, [(recipe_id, published_at)])
+
+
+def fan_out_recipe(recipe):
+    """Add a new recipe to the timelines of its author's subscribers.
+
+    The fan-out runs on the fan-out pool once the transaction commits.
+    Authors in pull mode are skipped; their recipes are pulled when a
+    feed is read.
+    """
+    job = partial(_fan_out_new_recipe, recipe.author_id, recipe.pk,
+                  recipe.published_at)
+    transaction.on_commit(partial(_submit_fan_out, job))
+
+
+def update_feed_modes(author_ids):
+    """Switch the authors between fan-out and pull mode.
+
+    Authors are pulled from FEED_FANOUT_MAX_SUBSCRIBERS subscribers on,
+    and fanned out again only below FEED_FANOUT_HYSTERESIS less, so a
+    count flapping around the threshold does not repeat the demotion.
+    Recipes published while pulled only reached the followers that read
+    their feed meanwhile, so a demoted author's recent recipes are fanned
+    out.
+    """
+    User.objects.filter(
+        pk__in=author_ids, pulls_feed=False,
+        subscribers_count__gte=settings.FEED_FANOUT_MAX_SUBSCRIBERS,
+    ).update(pulls_feed=True)
+
+    demoted_ids = list(
+        User.objects
+        .filter(pk__in=author_ids, pulls_feed=True,
+                subscribers_count__lt=(settings.FEED_FANOUT_MAX_SUBSCRIBERS
+                                       - settings.FEED_FANOUT_HYSTERESIS))
+        .values_list("pk", flat=True)
+    )
+    for author_id in demoted_ids:
+        # Only the worker that clears the flag fans the recipes out.
+        if User.objects.filter(pk=author_id, pulls_feed=True).update(
+                pulls_feed=False):
+            _fan_out(author_id, _recent_recipes([author_id]))
+
+
+def schedule_feed_mode_update(author_ids):
+    """Run update_feed_modes on the fan-out pool after commit."""
+    job = partial(update_feed_modes, list(author_ids))
+    transaction.on_commit(partial(_submit_fan_out, job))
+
+
+def pull_timeline(user):
+    """Copy new recipes of the followed pull-mode authors to the timeline.
+
+    Pulling on read keeps every feed page a read of the user's timeline
+    index. Only the recipes newer than the latest one already copied are
+    fetched.
+    """
+    author_ids = list(
+        Subscription.objects
+        .filter(subscriber=user,
+                subscribed_to__pulls_feed=True)
+        .values_list("subscribed_to", flat=True)
+    )
+    if not author_ids:
+        return
+
+    latest = (
+        TimelineEntry.objects
+        .filter(user=user, recipe__author_id__in=author_ids)
+        .aggregate(latest=models.Max("published_at"))["latest"]
+    )
+    recipes = (
+        Recipe.objects
+        .filter(author_id__in=author_ids)
+        .order_by("-published_at")
+    )
+    if latest is not None:
+        recipes = recipes.filter(published_at__gt=latest)
+    entries = [
+        TimelineEntry(user=user, recipe_id=recipe_id,
+                      published_at=published_at)
+        for recipe_id, published_at in recipes.values_list(
+            "id", "published_at")[:settings.FEED_MAX_ENTRIES]
+    ]
+    if entries:
+        TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+        prune_timelines([user.pk])
+
+
+def backfill_timeline(subscriber, author):
+    """Add the author's recent recipes to a new subscriber's timeline."""
+    backfill_timelines(subscriber, [author.pk])
+
+
+def backfill_timelines(subscriber, author_ids):
+    """Add the recent recipes of several new subscriptions at once."""
+    TimelineEntry.objects.bulk_create([
+        TimelineEntry(user=subscriber, recipe_id=recipe_id,
+                      published_at=published_at)
+        for recipe_id, published_at in _recent_recipes(author_ids)
+    ], ignore_conflicts=True)
+    prune_timelines([subscriber.pk])
+    schedule_feed_mode_update(author_ids)
+
+
+def remove_from_timeline(subscriber, author):
+    remove_from_timelines(subscriber, [author.pk])
+
+
+def remove_from_timelines(subscriber, author_ids):
+    TimelineEntry.objects.filter(user=subscriber,
+                                 recipe__author_id__in=author_ids).delete()
+    schedule_feed_mode_update(author_ids)
@@ -1,8 +1,26 @@
-from django.shortcuts import get_object_or_404, redirect
+from django.http import Http404
+from django.shortcuts import redirect
 
 from .models import Recipe
+from .short_links import decode_short_link, short_link_cache
+
+
+def _find_recipe_id(slug):
+    recipes = Recipe.objects.filter(short_link=slug)
+    # Encoded slugs carry the recipe id, so they are looked up by the
+    # primary key; legacy random slugs go through the short_link index.
+    recipe_id = decode_short_link(slug)
+    if recipe_id is not None:
+        recipes = recipes.filter(pk=recipe_id)
+    return recipes.values_list("id", flat=True).first()
 
 
 def short_link(request, slug):
-    recipe = get_object_or_404(Recipe, short_link=slug)
-    return redirect(f"/recipes/{recipe.id}/")
+    recipe_id = short_link_cache.get(slug)
+    if recipe_id is None:
+        recipe_id = _find_recipe_id(slug)
+        if recipe_id is None:
+            raise Http404("No recipe matches the given short link.")
+        short_link_cache.set(slug, recipe_id)
+
+    return redirect(f"/recipes/{recipe_id}/")
@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _
+from foodgram_backend import cache_stats
+from foodgram_backend.constants import AUTH_SNAPSHOT_VERSION, TOKEN_AUTH_CACHE
+from foodgram_backend.versions import get_version
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+# Only these columns are cached. The rest, such as the password hash and
+# the counters shifted by queryset updates, are deferred and load fresh on
+# access. updated_at stays loaded so that save() keeps stamping it.
+SNAPSHOT_USER_FIELDS = ("id", "username", "email", "first_name",
+                        "last_name", "avatar", "avatar_variants",
+                        "is_active", "is_staff", "updated_at")
+
+
+class SnapshotCache:
+    """Bounded, process-local LRU cache of token -> user snapshot.
+
+    Entries expire after `timeout` seconds, and the whole cache is
+    cleared when any process bumps the shared auth snapshot stamp.
+    """
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._version = None
+
+    def get(self, key):
+        version = get_version(AUTH_SNAPSHOT_VERSION)
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+                return None
+
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            snapshot, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return snapshot
+
+    def set(self, key, snapshot):
+        with self._lock:
+            self._entries[key] = (snapshot, time.monotonic() + self.timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+snapshot_cache = SnapshotCache(settings.TOKEN_AUTH_CACHE_SIZE,
+                               settings.TOKEN_AUTH_CACHE_TIMEOUT)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication backed by cached token -> user snapshots.
+
+    A hit costs one read of the shared auth snapshot stamp instead of the
+    Token -> User join. Entries live in process memory for
+    TOKEN_AUTH_CACHE_TIMEOUT seconds, and every process drops them as soon
+    as a token is deleted, as on logout, or a user is saved, which covers
+    password changes and deactivation.
+    """
+
+    def _load_snapshot(self, key):
+        values = (
+            self.get_model().objects
+            .filter(key=key)
+            .values_list(*(f"user__{name}" for name in SNAPSHOT_USER_FIELDS))
+            .first()
+        )
+        if values is None:
+            raise exceptions.AuthenticationFailed(_("Invalid token."))
+        return dict(zip(SNAPSHOT_USER_FIELDS, values))
+
+    def _build_user(self, snapshot):
+        """A user with the snapshot fields loaded and the rest deferred."""
+        user_model = get_user_model()
+        field_names = [field.attname
+                       for field in user_model._meta.concrete_fields
+                       if field.attname in snapshot]
+        return user_model.from_db(
+            user_model.objects.db, field_names,
+            [snapshot[name] for name in field_names])
+
+    def authenticate_credentials(self, key):
+        snapshot = snapshot_cache.get(key)
+        if snapshot is not None:
+            cache_stats.record(TOKEN_AUTH_CACHE, hits=1)
+        else:
+            cache_stats.record(TOKEN_AUTH_CACHE, misses=1)
+            snapshot = self._load_snapshot(key)
+            snapshot_cache.set(key, snapshot)
+
+        user = self._build_user(snapshot)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _("User inactive or deleted."))
+
+        return (user, self.get_model()(key=key, user=user))
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 04:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = (
+        ("users", "0002_alter_subscription_options_alter_user_options_and_more"),
+    )
+
+    operations = (
+        migrations.AddField(
+            model_name="user",
+            name="recipes_count",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="Количество рецептов"),
+        ),
+    )
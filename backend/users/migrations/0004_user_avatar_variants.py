@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 04:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = (
+        ("users", "0003_user_recipes_count"),
+    )
+
+    operations = (
+        migrations.AddField(
+            model_name="user",
+            name="avatar_variants",
+            field=models.JSONField(default=dict, editable=False, verbose_name="Варианты аватара"),
+        ),
+    )
@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-18 04:39
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_subscribers_count(apps, schema_editor):
+    User = apps.get_model("users", "User")
+    Subscription = apps.get_model("users", "Subscription")
+
+    User.objects.update(subscribers_count=Coalesce(models.Subquery(
+        Subscription.objects
+        .filter(subscribed_to=models.OuterRef("pk"))
+        .order_by()
+        .values("subscribed_to")
+        .annotate(total=models.Count("pk"))
+        .values("total")
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = (
+        ("users", "0004_user_avatar_variants"),
+    )
+
+    operations = (
+        migrations.AddField(
+            model_name="user",
+            name="subscribers_count",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="Количество подписчиков"),
+        ),
+        migrations.RunPython(fill_subscribers_count,
+                             migrations.RunPython.noop),
+    )
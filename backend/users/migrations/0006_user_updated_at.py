@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 05:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = (
+        ("users", "0005_user_subscribers_count"),
+    )
+
+    operations = (
+        migrations.AddField(
+            model_name="user",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, verbose_name="Дата изменения"),
+        ),
+    )
@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-18 09:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_pulls_feed(apps, schema_editor):
+    User = apps.get_model("users", "User")
+
+    User.objects.filter(
+        subscribers_count__gte=settings.FEED_FANOUT_MAX_SUBSCRIBERS,
+    ).update(pulls_feed=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = (
+        ("users", "0006_user_updated_at"),
+    )
+
+    operations = (
+        migrations.AddField(
+            model_name="user",
+            name="pulls_feed",
+            field=models.BooleanField(default=False, editable=False, verbose_name="Рецепты добавляются в ленты при чтении"),
+        ),
+        migrations.RunPython(fill_pulls_feed, migrations.RunPython.noop),
+    )
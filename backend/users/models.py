@@ -1,11 +1,13 @@
 from django.contrib.auth import validators
 from django.contrib.auth.models import AbstractUser
 from django.db import models
-from foodgram_backend.constants import (USER_AVATAR_PATH,
-                                        USER_EMAIL_MAX_LENGTH,
-                                        USER_FIRST_NAME_MAX_LENGTH,
-                                        USER_LAST_NAME_MAX_LENGTH,
-                                        USER_USERNAME_MAX_LENGTH)
+from foodgram_backend.constants import (
+    USER_AVATAR_PATH,
+    USER_EMAIL_MAX_LENGTH,
+    USER_FIRST_NAME_MAX_LENGTH,
+    USER_LAST_NAME_MAX_LENGTH,
+    USER_USERNAME_MAX_LENGTH,
+)
 
 
 class User(AbstractUser):
@@ -36,6 +38,30 @@ class User(AbstractUser):
                                upload_to=USER_AVATAR_PATH,
                                blank=True,
                                default=None)
+    avatar_variants = models.JSONField(
+        verbose_name="Варианты аватара",
+        default=dict,
+        editable=False,
+    )
+
+    recipes_count = models.PositiveIntegerField(
+        verbose_name="Количество рецептов",
+        default=0,
+        editable=False,
+    )
+    subscribers_count = models.PositiveIntegerField(
+        verbose_name="Количество подписчиков",
+        default=0,
+        editable=False,
+    )
+    pulls_feed = models.BooleanField(
+        verbose_name="Рецепты добавляются в ленты при чтении",
+        default=False,
+        editable=False,
+    )
+
+    updated_at = models.DateTimeField(verbose_name="Дата изменения",
+                                      auto_now=True)
 
     class Meta(AbstractUser.Meta):
         verbose_name = "пользователь"
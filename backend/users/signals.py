@@ -0,0 +1,44 @@
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from foodgram_backend.constants import (
+    AUTH_SNAPSHOT_VERSION,
+    USER_PROFILE_VERSION,
+)
+from foodgram_backend.image_variants import schedule_variants
+from foodgram_backend.versions import bump_version
+from rest_framework.authtoken.models import Token
+
+from .models import Subscription, User
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {"last_login"}:
+        return
+    transaction.on_commit(partial(bump_version, USER_PROFILE_VERSION))
+
+
+@receiver(post_save, sender=User)
+def user_saved(instance, **kwargs):
+    schedule_variants(instance, "avatar", settings.AVATAR_VARIANTS)
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_snapshot_changed(update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {"last_login"}:
+        return
+    transaction.on_commit(partial(bump_version, AUTH_SNAPSHOT_VERSION))
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(**kwargs):
+    transaction.on_commit(partial(bump_version, AUTH_SNAPSHOT_VERSION))
+
+
+@receiver([post_save, post_delete], sender=Subscription)
+def subscription_changed(**kwargs):
+    transaction.on_commit(partial(bump_version, USER_PROFILE_VERSION))